@@ -3,9 +3,9 @@
 import tkinter as tk
 from tkinter import ttk
 import hid
-import time
-import threading
 from busylight_commands import COMMANDS, COLOR_RGB
+from busylight_animations import animation_packet
+from device_registry import DeviceRegistry
 from queue import Queue, Empty
 
 class BusylightGUI:
@@ -16,8 +16,8 @@ class BusylightGUI:
         # Store busylight devices and their states
         self.busylights = []
         self.light_states = {}  # Stores whether each light is cycling
-        self.color_cycles = {}  # Stores color cycle threads
         self.command_queues = {}  # Queue for each light
+        self.selected_light = None
         
         # Find and connect to busylights
         self.find_busylights()
@@ -32,7 +32,6 @@ class BusylightGUI:
         
         # Create circles for each light
         self.circles = {}
-        self.selected_light = None
         self.create_light_circles()
         
         # Create color selection frame
@@ -42,29 +41,26 @@ class BusylightGUI:
         self.update_gui()
 
     def find_busylights(self):
-        """Find and connect to all Busylight devices"""
-        BUSYLIGHT_MODELS = {
-            0x3BCF: "Busylight Omega",
-            0x3BCE: "Busylight Alpha"
-        }
-        VID = 0x27BB
-        
-        for PID in BUSYLIGHT_MODELS.keys():
-            found_devices = hid.enumerate(VID, PID)
-            for device_info in found_devices:
-                device = hid.device()
-                device.open_path(device_info['path'])
-                
-                busylight = {
-                    'info': device_info,
-                    'model': BUSYLIGHT_MODELS[PID],
-                    'device': device,
-                    'path': device_info['path']
-                }
-                
-                self.busylights.append(busylight)
-                self.light_states[device_info['path']] = False
-                self.command_queues[device_info['path']] = Queue()
+        """Find and connect to all Busylight devices, and keep watching for new ones"""
+        self.registry = DeviceRegistry(hid)
+        self.registry.scan()
+        self.registry.start()
+        self.sync_busylights()
+
+    def sync_busylights(self):
+        """Pick up lights the registry connected or evicted since the last check"""
+        self.busylights = self.registry.devices()
+        paths = [light['path'] for light in self.busylights]
+        for path in paths:
+            if path not in self.command_queues:
+                self.light_states[path] = False
+                self.command_queues[path] = Queue()
+        for path in list(self.command_queues):
+            if path not in paths:
+                del self.light_states[path]
+                del self.command_queues[path]
+        if self.selected_light not in paths:
+            self.selected_light = None
 
     def create_light_circles(self):
         """Create clickable circles representing each light"""
@@ -73,6 +69,8 @@ class BusylightGUI:
         start_x = 50
         y = 100
         
+        self.canvas.delete("all")
+        self.circles = {}
         for i, light in enumerate(self.busylights):
             x = start_x + (i * spacing)
             circle = self.canvas.create_oval(
@@ -130,40 +128,6 @@ class BusylightGUI:
         # Update controls to show current state
         self.cycle_var.set(self.light_states[path])
 
-    def create_command(self, r, g, b):
-        """Create a command packet with given RGB values"""
-        return [
-            0x00, 0x10, 0x01, r, g, b, 0x01, 0x00,
-            0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-            0x52
-        ]
-
-    def color_cycle_thread(self, path):
-        """Thread function for color cycling"""
-        target_sum = 0x64
-        step = 0x05
-        
-        while self.light_states[path]:
-            for r in range(0, target_sum + 1, step):
-                if not self.light_states[path]:
-                    break
-                    
-                for g in range(0, target_sum - r + 1, step):
-                    if not self.light_states[path]:
-                        break
-                        
-                    b = target_sum - r - g
-                    if b >= 0:
-                        command = self.create_command(r, g, b)
-                        self.command_queues[path].put(command)
-                        time.sleep(0.05)
-
     def toggle_color_cycle(self):
         """Toggle color cycling for selected light"""
         if not self.selected_light:
@@ -172,14 +136,8 @@ class BusylightGUI:
         self.light_states[self.selected_light] = self.cycle_var.get()
         
         if self.cycle_var.get():
-            # Start color cycle thread
-            thread = threading.Thread(
-                target=self.color_cycle_thread,
-                args=(self.selected_light,),
-                daemon=True
-            )
-            self.color_cycles[self.selected_light] = thread
-            thread.start()
+            # Upload the rainbow once; the light plays it by itself
+            self.command_queues[self.selected_light].put(animation_packet('rainbow'))
         else:
             # Stop color cycle and set to white
             self.command_queues[self.selected_light].put(COMMANDS['white'])
@@ -200,18 +158,25 @@ class BusylightGUI:
 
     def update_gui(self):
         """Update GUI and process command queues"""
+        # Redraw when lights were plugged in or pulled out
+        if set(self.registry.paths()) != set(self.circles):
+            self.sync_busylights()
+            self.create_light_circles()
+
         # Process command queues
-        for path, queue in self.command_queues.items():
+        for light in self.busylights:
+            queue = self.command_queues[light['path']]
             try:
                 while True:
                     command = queue.get_nowait()
-                    # Find the corresponding device
-                    for light in self.busylights:
-                        if light['path'] == path:
-                            light['device'].write(command)
-                            break
+                    light['device'].write(command)
+                    self.registry.write_succeeded(light['path'])
             except Empty:
                 pass
+            except Exception as e:
+                # Dead handle: drop it and let the watcher reopen it if it comes back
+                self.registry.evict(light['path'], e)
+                self.registry.request_scan()
         
         # Update circle colors based on last command
         for path, circle in self.circles.items():
@@ -236,10 +201,14 @@ class BusylightGUI:
             self.light_states[path] = False
         
         # Turn off all lights
+        self.registry.stop()
         off_command = COMMANDS['off']
-        for light in self.busylights:
-            light['device'].write(off_command)
-            light['device'].close()
+        for light in self.registry.devices():
+            try:
+                light['device'].write(off_command)
+            except Exception as e:
+                print(f"Error turning off {light['path']!r}: {e}")
+        self.registry.close_all()
 
 def main():
     root = tk.Tk()
@@ -3,37 +3,65 @@
 import pygame
 import hid
 import sys
-from time import sleep
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
+import time
+from concurrent.futures import Future
 import numpy as np
 import pyttsx3
 from gtts import gTTS
-import os
+import io
+import heapq
 import threading
+from collections import deque
 from pygame import mixer
 import pyperclip
 
-import speech_recognition as sr  # pip install SpeechRecognition
+from speech_pipeline import SpeechPipeline, MicrophoneSource, google_recognizer
 
 # Import our command definitions
 from busylight_commands import (
-    COMMANDS, KEEPALIVE, COLOR_RGB, EMOTION_COLORS,
+    COMMANDS, KEEPALIVE, MODEL_WARMING_COLOR,
     VENDOR_ID, PRODUCT_IDS
 )
+from classification_cache import ClassificationCache, cache_key
+from inference_backends import softmax
+from hid_writer import HIDWriteScheduler, KeepaliveScheduler
+from device_registry import DeviceRegistry
+from device_groups import DeviceGroups
+from busylight_protocol import build_program
+from busylight_animations import timeline_animation
+from emotion_mapping import EmotionMapping, MappingReloader, default_config
+from ui_render import TextCache, DirtyRegions, FrameStats
+from audio_cache import AudioCache
+from live_classifier import LiveClassifier
+from emotion_state import EmotionStateTracker
+from metrics import METRICS, install_profile_signal
+from inference_daemon import connect_daemon
+from emotion_store import EmotionStore, StoreLockedError
 
 
 
-# Add this to your TextToSpeech class or create a new SpeechInput class
 class SpeechInput:
-    def __init__(self):
-        self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
-        self.is_listening = False
-        
-        # Adjust for ambient noise on startup
-        with self.microphone as source:
-            self.recognizer.adjust_for_ambient_noise(source)
+    """Push-to-talk speech input backed by a background SpeechPipeline"""
+
+    def __init__(self, source=None, recognizer=None):
+        self.pipeline = SpeechPipeline(
+            source or MicrophoneSource(),
+            recognizer or google_recognizer(),
+            push_to_talk=True,
+        ).start()
+
+    @property
+    def is_listening(self):
+        return self.pipeline.active
+
+    @is_listening.setter
+    def is_listening(self, listening):
+        self.pipeline.set_active(listening)
+
+    @property
+    def busy(self):
+        """True while a phrase is being captured or recognized"""
+        return self.is_listening or self.pipeline.busy
     
     def draw_indicator(self, screen, pos=(700, 50), size=30):
         """Draw microphone indicator"""
@@ -49,31 +77,74 @@ class SpeechInput:
 
 
     def listen(self):
-        """Listen for speech and convert to text"""
-        try:
-            with self.microphone as source:
-                audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=None)
-                text = self.recognizer.recognize_google(audio)
-                return text
-        except sr.WaitTimeoutError:
-            return None
-        except sr.UnknownValueError:
-            return None
-        except sr.RequestError as e:
-            print(f"Could not request results; {e}")
-            return None
+        """Return recognized text captured so far, or None; never blocks"""
+        texts = self.pipeline.poll()
+        return " ".join(texts) if texts else None
         
 
+# Utterance priorities; lower numbers are spoken first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
 class TextToSpeech:
-    def __init__(self, use_offline=True):
+    """One long-lived speech worker fed by a bounded priority queue.
+
+    speak() never blocks. When the queue is full, drop_policy decides whether
+    the oldest lowest-priority utterance ('drop_oldest') or the new one
+    ('drop_newest') is discarded; 'drop_oldest' still drops the new one if it
+    ranks below everything queued. interrupt=True barges in: whatever is
+    playing (or being synthesized) stops and everything queued before it is
+    cancelled. Utterances
+    that waited longer than max_age seconds are skipped as stale.
+    """
+
+    def __init__(self, use_offline=True, lang='en', tld='com', slow=False, audio_cache=None,
+                 max_queue=8, drop_policy='drop_oldest', max_age=10.0):
+        if drop_policy not in ('drop_oldest', 'drop_newest'):
+            raise ValueError(f"Unknown drop policy '{drop_policy}'")
         self.use_offline = use_offline
-        if use_offline:
+        # Online voice settings; together with the text they key the audio cache
+        self.lang = lang
+        self.tld = tld
+        self.slow = slow
+        self.audio_cache = audio_cache or AudioCache()
+        self.max_queue = max_queue
+        self.drop_policy = drop_policy
+        self.max_age = max_age
+
+        self.queue = []  # heap of (priority, sequence, generation, requested_at, text)
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.generation = 0  # Bumped by barge-in; older utterances are cancelled
+        self.playback_done = threading.Event()
+        self.current_sound = None
+        self.engine = None
+
+        # Metrics
+        self.first_audio_latencies = deque(maxlen=100)  # speak() to first audio, seconds
+        self.queue_waits = deque(maxlen=100)  # speak() to dequeue, seconds
+        self.spoken = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.stale = 0
+        self.max_depth = 0
+        self._utterance_started = None
+
+        self.worker = threading.Thread(target=self._speech_loop, daemon=True, name="tts-worker")
+        self.worker.start()
+
+    def _init_engine(self):
+        """Create the speech engine on the worker thread that will drive it"""
+        if self.use_offline:
             self.engine = pyttsx3.init()
             self.engine.setProperty('rate', 175)
             self.engine.setProperty('volume', 0.9)
+            self.engine.connect('started-utterance', self._on_offline_start)
             voices = self.engine.getProperty('voices')
             print("Loading voices...")
-        # Print available voices (useful for debugging)
+            # Print available voices (useful for debugging)
             for idx, voice in enumerate(voices):
                 print(f"Voice {idx}:")
                 print(f" - ID: {voice.id}")
@@ -82,226 +153,707 @@ class TextToSpeech:
                 print(f" - Gender: {voice.gender}")
                 print(f" - Age: {voice.age}\n")
         
-        # Set voice (typically index 1 is a female voice if available)
-        if len(voices) > 1:
-            self.engine.setProperty('voice', voices[1].id)
-        
+            # Set voice (typically index 1 is a female voice if available)
+            if len(voices) > 1:
+                self.engine.setProperty('voice', voices[1].id)
         else:
             mixer.init()
 
-    def speak(self, text):
-        if self.use_offline:
-            threading.Thread(target=self._speak_offline, args=(text,)).start()
-        else:
-            threading.Thread(target=self._speak_online, args=(text,)).start()
+    def speak(self, text, priority=PRIORITY_NORMAL, interrupt=False):
+        """Queue text to be spoken; returns False if it was dropped"""
+        requested_at = time.perf_counter()
+        with self.condition:
+            if interrupt:
+                self.generation += 1
+                self.cancelled += len(self.queue)
+                self.queue.clear()
+                self._stop_playback()
 
-    def _speak_offline(self, text):
-        self.engine.say(text)
-        self.engine.runAndWait()
+            if len(self.queue) >= self.max_queue:
+                self.dropped += 1
+                if self.drop_policy == 'drop_newest':
+                    return False
+                # Drop the oldest of the lowest-priority utterances, unless the new one ranks
+                # below all of them; then it is the one that goes
+                victim = max(self.queue, key=lambda item: (item[0], -item[1]))
+                if priority > victim[0]:
+                    return False
+                self.queue.remove(victim)
+                heapq.heapify(self.queue)
+
+            self.sequence += 1
+            heapq.heappush(self.queue, (priority, self.sequence, self.generation, requested_at, text))
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.condition.notify()
+        return True
 
-    def _speak_online(self, text):
+    def cancel_all(self):
+        """Stop speaking and drop everything queued"""
+        with self.condition:
+            self.generation += 1
+            self.cancelled += len(self.queue)
+            self.queue.clear()
+            self._stop_playback()
+
+    def _stop_playback(self):
+        if self.use_offline:
+            if self.engine is not None:
+                self.engine.stop()
+        elif self.current_sound is not None:
+            self.current_sound.stop()
+        self.playback_done.set()
+
+    def _speech_loop(self):
         try:
-            tts = gTTS(text=text, lang='en')
-            tts.save("temp_speech.mp3")
-            mixer.music.load("temp_speech.mp3")
-            mixer.music.play()
-            while mixer.music.get_busy():
-                sleep(0.1)
-            mixer.music.unload()
-            os.remove("temp_speech.mp3")
+            self._init_engine()
         except Exception as e:
-            print(f"Error in text-to-speech: {e}")
+            print(f"Error starting text-to-speech: {e}")
+            return
+
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                _, _, generation, requested_at, text = heapq.heappop(self.queue)
+                current_generation = self.generation
+
+            waited = time.perf_counter() - requested_at
+            if generation != current_generation:
+                continue
+            if self.max_age is not None and waited > self.max_age:
+                self.stale += 1
+                continue
+            self.queue_waits.append(waited)
+
+            try:
+                if self.use_offline:
+                    spoke = self._speak_offline(text, requested_at, generation)
+                else:
+                    spoke = self._speak_online(text, requested_at, generation)
+                if spoke:
+                    self.spoken += 1
+            except Exception as e:
+                print(f"Error in text-to-speech: {e}")
+
+    def _on_offline_start(self, name):
+        if self._utterance_started is not None:
+            self.first_audio_latencies.append(time.perf_counter() - self._utterance_started)
+            self._utterance_started = None
+
+    def _still_wanted(self, generation):
+        """False if a barge-in cancelled this utterance since it was dequeued (hold self.condition)"""
+        if generation == self.generation:
+            return True
+        self.cancelled += 1
+        return False
+
+    def _speak_offline(self, text, requested_at, generation):
+        # Queue the utterance under the lock, so an interrupt either sees it and stops it
+        # or happened before and is caught by the generation check
+        with self.condition:
+            if not self._still_wanted(generation):
+                return False
+            self._utterance_started = requested_at
+            self.engine.say(text)
+        self.engine.runAndWait()
+        return True
+
+    def synthesize(self, text):
+        """MP3 bytes for text from gTTS, served from the audio cache when possible"""
+        key = (text, f"{self.lang}-{self.tld}", self.slow)
+        audio = self.audio_cache.get(key)
+        if audio is None:
+            buffer = io.BytesIO()
+            gTTS(text=text, lang=self.lang, tld=self.tld, slow=self.slow).write_to_fp(buffer)
+            audio = buffer.getvalue()
+            self.audio_cache.put(key, audio)
+        return audio
+
+    def _speak_online(self, text, requested_at, generation):
+        sound = mixer.Sound(file=io.BytesIO(self.synthesize(text)))
+        # Synthesis can take a while; don't play something a barge-in cancelled meanwhile
+        with self.condition:
+            if not self._still_wanted(generation):
+                return False
+            self.playback_done.clear()
+            self.current_sound = sound
+            sound.play()
+        self.first_audio_latencies.append(time.perf_counter() - requested_at)
+        # Sleep for the clip's length (or until barge-in) instead of polling get_busy()
+        self.playback_done.wait(sound.get_length())
+        self.current_sound = None
+        return True
+
+    def stats(self):
+        """Queue depth, drop/cancel counts, latencies (ms) and audio cache counters"""
+        with self.condition:
+            stats = {
+                'queue_depth': len(self.queue),
+                'max_queue_depth': self.max_depth,
+                'spoken': self.spoken,
+                'dropped': self.dropped,
+                'cancelled': self.cancelled,
+                'stale': self.stale,
+            }
+        for name, samples in (('first_audio', self.first_audio_latencies),
+                              ('queue_wait', self.queue_waits)):
+            samples = sorted(samples)
+            if samples:
+                stats[f'{name}_p50_ms'] = samples[len(samples) // 2] * 1000
+                stats[f'{name}_max_ms'] = samples[-1] * 1000
+        stats.update(self.audio_cache.stats())
+        return stats
 
 class EmotionClassifier:
-    def __init__(self, model_name="j-hartmann/emotion-english-distilroberta-base"):
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model.to(self.device)
+    def __init__(self, model_name="j-hartmann/emotion-english-distilroberta-base", cache=None,
+                 backend='torch', load_in_background=False, warmup=True):
+        self.model_name = model_name
+        self.cache = cache  # Optional ClassificationCache in front of the model
+        self.backend_name = backend
+        self.warmup = warmup
+        # Quantized/ONNX outputs differ slightly from fp32, so keep their cache entries apart
+        self.cache_namespace = model_name if backend == 'torch' else f"{model_name}#{backend}"
         self.labels = ['anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise']
-        
+
+        # The model is loaded on first use, or up front on a background thread.
+        # `ready` resolves once the tokenizer and backend can serve requests.
+        self.tokenizer = None
+        self.model = None
+        self.backend = None
+        self.device = None
+        self.ready = Future()
+        self._load_lock = threading.Lock()
+        self._load_started = False
+        # The tokenizer and backend are not thread-safe; the UI, live and speech threads share them
+        self._inference_lock = threading.RLock()
+        if load_in_background:
+            self.load_async()
+
+    @property
+    def is_ready(self):
+        return self.ready.done() and self.ready.exception() is None
+
+    def load_async(self):
+        """Start loading the model on a background thread; returns the readiness future"""
+        with self._load_lock:
+            if self._load_started:
+                return self.ready
+            self._load_started = True
+        threading.Thread(target=self._load, daemon=True).start()
+        return self.ready
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the model is loaded, loading it here if nobody has started yet"""
+        with self._load_lock:
+            start_here = not self._load_started
+            self._load_started = True
+        if start_here:
+            self._load()
+        return self.ready.result(timeout=timeout)
+
+    def _load(self):
+        """Import torch/transformers, load the model and optionally run a warm-up pass"""
+        try:
+            import torch
+            from transformers import AutoTokenizer, AutoModelForSequenceClassification
+            from inference_backends import create_backend
+
+            start = time.perf_counter()
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+            self.device = "cuda" if torch.cuda.is_available() and self.backend_name == 'torch' else "cpu"
+            self.backend = create_backend(self.backend_name, self.model, device=self.device,
+                                          model_name=self.model_name)
+            if self.warmup:
+                # First forward pass pays for allocator and kernel setup; do it now
+                self._run_model(["Warming up the emotion model."], 1, 512)
+            print(f"Emotion model ready in {time.perf_counter() - start:.1f}s")
+            self.ready.set_result(True)
+        except Exception as e:
+            print(f"Failed to load emotion model: {e}")
+            self.ready.set_exception(e)
+
     def classify(self, text):
-           
-           inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-           inputs = {k: v.to(self.device) for k, v in inputs.items()}
-    
-           with torch.no_grad():
-                outputs = self.model(**inputs)
-    
-           probs = torch.nn.functional.softmax(outputs.logits, dim=1)
-           probs = probs.cpu().numpy()[0]
-           prediction = int(np.argmax(probs))
-    
-           # Create dictionary of emotion probabilities
-           emotion_probs = {emotion: float(prob) for emotion, prob in zip(self.labels, probs)}
-    
-           return self.labels[prediction], emotion_probs
-    
+        """Classify a single text, returning the top label and a dict of probabilities"""
+        probs = self.classify_batch([text])[0]
+        return self.to_result(probs)
+
+    def to_result(self, probs):
+        """Turn one row of probabilities into the (label, {label: prob}) pair classify returns"""
+        prediction = int(np.argmax(probs))
+
+        # Create dictionary of emotion probabilities
+        emotion_probs = {emotion: float(prob) for emotion, prob in zip(self.labels, probs)}
+
+        return self.labels[prediction], emotion_probs
+
+    def classify_batch(self, texts, batch_size=32, max_length=512):
+        """Classify many texts at once, returning an (N, len(self.labels)) probability matrix.
+
+        Texts are sorted by token length and padded per batch to the longest
+        member only, so short messages never pay for max_length. Duplicate
+        texts are classified once.
+        """
+        texts = list(texts)
+        self.wait_until_ready()
+        with self._inference_lock:
+            return self._classify_locked(texts, batch_size, max_length)
+
+    def _classify_locked(self, texts, batch_size, max_length):
+        if self.cache is None:
+            # Repeated texts go through the model once
+            unique = {}
+            inverse = [unique.setdefault(text, len(unique)) for text in texts]
+            if len(unique) == len(texts):
+                return self._run_model(texts, batch_size, max_length)
+            return self._run_model(list(unique), batch_size, max_length)[inverse]
+
+        probs = np.zeros((len(texts), len(self.labels)), dtype=np.float32)
+        positions = {}  # cache key -> indices of the texts that share it
+        for i, text in enumerate(texts):
+            positions.setdefault(cache_key(text, self.cache_namespace), []).append(i)
+        missing = []
+        for key, indices in positions.items():
+            cached = self.cache.get(key)
+            if cached is None:
+                missing.append(key)
+            else:
+                probs[indices] = cached
+
+        METRICS.inc('cache_hits', len(positions) - len(missing))
+        METRICS.inc('cache_misses', len(missing))
+        if missing:
+            fresh = self._run_model([texts[positions[key][0]] for key in missing], batch_size, max_length)
+            for row, key in zip(fresh, missing):
+                probs[positions[key]] = row
+                self.cache.put(key, row)
+
+        return probs
+
+    def _run_model(self, texts, batch_size, max_length):
+        """Length-sorted, dynamically padded forward passes over texts"""
+        if not texts:
+            return np.zeros((0, len(self.labels)), dtype=np.float32)
+
+        with METRICS.span('tokenize'):
+            encoded = self.tokenizer(texts, truncation=True, max_length=max_length)
+        return self._forward_encoded(encoded, batch_size)
+
+    def _forward_encoded(self, encoded, batch_size):
+        """Probabilities for already tokenized sequences, batched by length"""
+        keys = ['input_ids', 'attention_mask']
+        count = len(encoded['input_ids'])
+        probs = np.zeros((count, len(self.labels)), dtype=np.float32)
+        order = sorted(range(count), key=lambda i: len(encoded['input_ids'][i]))
+
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            features = [{k: encoded[k][i] for k in keys} for i in chunk]
+            with METRICS.span('pad'):
+                inputs = self.tokenizer.pad(features, return_tensors="np")
+            with METRICS.span('forward'):
+                logits = self.backend(inputs['input_ids'], inputs['attention_mask'])
+            with METRICS.span('softmax'):
+                probs[chunk] = softmax(logits)
+        METRICS.inc('texts_classified', count)
+
+        return probs
+
+    def classify_long(self, text, window=512, stride=128, aggregate='mean', max_windows=32,
+                      batch_size=16, recency_decay=0.7):
+        """Score a document of any length with overlapping token windows.
+
+        Returns (label, {label: prob}, timeline), where timeline is a list of
+        per-window dicts with 'start'/'end' character offsets, 'emotion' and
+        'probs'. Window probabilities are combined by `aggregate`:
+        'mean' (weighted by window length), 'max' (per label, renormalized)
+        or 'recency' (later windows weigh more, by recency_decay per step back).
+
+        Cost: each window advances by window - stride - 2 tokens, so the
+        defaults run about 2.6 windows (~1.3k padded tokens of compute) per
+        1k input tokens. Documents needing more than max_windows windows are
+        scored on max_windows evenly spaced windows, so cost is bounded at
+        max_windows forward passes of `window` tokens whatever the length.
+        """
+        if aggregate not in ('mean', 'max', 'recency'):
+            raise ValueError(f"Unknown aggregate '{aggregate}'")
+        self.wait_until_ready()
+
+        with self._inference_lock:
+            encoded = self.tokenizer(
+                text, truncation=True, max_length=window, stride=stride,
+                return_overflowing_tokens=True, return_offsets_mapping=True,
+            )
+        count = len(encoded['input_ids'])
+        keep = range(count)
+        if count > max_windows:
+            keep = np.unique(np.linspace(0, count - 1, max_windows).round().astype(int))
+        windows = {k: [encoded[k][i] for i in keep] for k in ('input_ids', 'attention_mask')}
+        spans = []
+        for i in keep:
+            offsets = [o for o in encoded['offset_mapping'][i] if o[1] > o[0]]
+            spans.append((offsets[0][0], offsets[-1][1]) if offsets else (0, 0))
+
+        with self._inference_lock:
+            probs = self._forward_encoded(windows, batch_size)
+        lengths = np.array([len(ids) for ids in windows['input_ids']], dtype=np.float32)
+
+        if aggregate == 'mean':
+            combined = (probs * lengths[:, None]).sum(axis=0) / lengths.sum()
+        elif aggregate == 'max':
+            combined = probs.max(axis=0)
+            combined = combined / combined.sum()
+        else:
+            weights = recency_decay ** np.arange(len(probs) - 1, -1, -1, dtype=np.float32)
+            combined = (probs * weights[:, None]).sum(axis=0) / weights.sum()
+
+        timeline = [{
+            'start': start,
+            'end': end,
+            'emotion': self.labels[int(np.argmax(row))],
+            'probs': row,
+        } for (start, end), row in zip(spans, probs)]
+
+        label, emotion_probs = self.to_result(combined)
+        return label, emotion_probs, timeline
+
+
+# Texts longer than this (roughly 512 tokens of English) use sliding-window scoring
+LONG_TEXT_CHARS = 2000
+
+# Seconds between keepalives; must stay under the light's 15s keepalive timeout
+KEEPALIVE_INTERVAL = 10.0
+
 
 class EmotionalBusylight:
-    def __init__(self):
+    def __init__(self, cache_path=None, hid_backend=hid, animate_emotions=False, speak=True,
+                 model_name="j-hartmann/emotion-english-distilroberta-base", backend='torch',
+                 groups=None, load_model=True, classifier=None, store=None, mapping=None):
         self.vid = VENDOR_ID
         self.pid = PRODUCT_IDS
-        self.device = None
+        self.hid = hid_backend  # The hid module, or fake_hid.FakeHIDBackend for testing
         self.current_color = 'off'
-        
-        # Initialize emotion classifier and text-to-speech
-        self.emotion_classifier = EmotionClassifier()
-        self.tts = TextToSpeech(use_offline=True)
-        
-        # Start connection
+        self.last_command = None  # Last packet sent to the lights, to skip redundant writes
+        self.display_state = None  # (state, smoothed probs) the lights were last set from, for the UI
+        # How emotions look: a mapping file (reloaded when it changes) or the built-in
+        # colors, with each emotion's on-device signature animation if animate_emotions
+        self.mapping_reloader = None
+        if mapping is None:
+            self.static_mapping = EmotionMapping(default_config(animate=animate_emotions))
+        elif isinstance(mapping, EmotionMapping):
+            self.static_mapping = mapping
+        else:
+            self.mapping_reloader = MappingReloader(mapping, on_reload=self._on_mapping_reload)
+            self.mapping_reloader.start()
+        # Named subsets of the lights (device_groups.DeviceGroups), each with its own state
+        self.groups = groups if groups is not None else DeviceGroups()
+        self.group_states = {}    # group name -> EmotionStateTracker
+        self.group_commands = {}  # group name -> last packet sent to that group
+        # Optional emotion_store.EmotionStore that keeps every result for analytics
+        self.store = store
+
+        # Writes go through per-device writer threads so a slow light can't stall the UI;
+        # a failed write evicts the light and triggers a re-enumeration
+        self.writer = HIDWriteScheduler(on_error=self._on_write_error,
+                                        on_first_write=self._on_first_write)
+        # Lights plugged in later are picked up by the registry's watcher
+        self.registry = DeviceRegistry(self.hid, self.vid, self.pid,
+                                       on_connect=self._on_device_connected,
+                                       on_disconnect=self._on_device_disconnected)
+
+        # Connect first so the lights can show that the model is warming up
         self.connect()
-        
-        # Start keepalive thread
-        self.keepalive_thread = threading.Thread(target=self._keepalive_loop)
-        self.keepalive_thread.daemon = True
-        self.keepalive_thread.start()
+        if load_model:
+            self.set_color(MODEL_WARMING_COLOR)
 
-    def _keepalive_loop(self):
-        """Send keepalive signals periodically"""
-        while True:
-            if self.device:
-                try:
-                    self.device.write(KEEPALIVE)
-                except Exception as e:
-                    print(f"Keepalive error: {e}")
-            sleep(30)
+        # Load the emotion model in the background; lights go dark once it is ready.
+        # Light-only processes (see feelix_shard.py) get their emotions from elsewhere, and
+        # `classifier` can be a shared model, e.g. an inference_daemon.InferenceClient.
+        self.emotion_classifier = classifier or EmotionClassifier(
+            model_name, cache=ClassificationCache(disk_path=cache_path), backend=backend)
+        if load_model:
+            self.emotion_classifier.load_async().add_done_callback(self._on_model_ready)
+        # Smooths results over time so near-ties don't make the lights flap
+        self.emotion_state = EmotionStateTracker(self.emotion_classifier.labels)
+        self.tts = TextToSpeech(use_offline=True) if speak else None
+
+        # One timer thread keeps every light alive, skipping lights that were just written
+        self.keepalive = KeepaliveScheduler(self.writer, KEEPALIVE, interval=KEEPALIVE_INTERVAL)
+        self.keepalive.start()
+
+    @property
+    def devices(self):
+        """Open device handles; changes as lights are plugged in or pulled out"""
+        return self.registry.handles()
 
     def connect(self):
-        """Connect to multiple Busylight devices"""
-        self.devices = []
-        for pid in self.pid:
-            devices = hid.enumerate(self.vid, pid)
-            for device_info in devices:
-                try:
-                    device = hid.device()
-                    device.open_path(device_info['path'])
-                    self.devices.append(device)
-                    print(f"Connected to Busylight at {device_info['path']}")
-                except Exception as e:
-                    print(f"Failed to connect to device: {e}")
-
-            if not self.devices:
-                print("No Busylight devices found")
+        """Connect to the Busylights present now and watch for hot-plugged ones"""
+        self.registry.scan()
+        self.registry.start()
+        if not self.devices:
+            print("No Busylight devices found")
         else:
             print(f"Connected to {len(self.devices)} Busylight device(s)")
     
     def disconnect(self):
-        """Disconnect from the Busylight device"""
-        if self.device:
-            self.device.close()
+        """Disconnect from the Busylight devices"""
+        self.keepalive.stop()
+        self.registry.stop()
+        self.writer.stop()
+        self.registry.close_all()
+
+    def _on_device_connected(self, path, device):
+        self.writer.add_device(device, path)
+        # Bring a newly plugged light up to the current state, or its group's
+        command = self.last_command
+        for light in self.registry.devices():
+            if light['path'] == path:
+                for group in self.groups.groups_of(light):
+                    command = self.group_commands.get(group, command)
+        if command is not None:
+            self.writer.submit(command, names=[path])
+
+    def _on_device_disconnected(self, path):
+        self.writer.remove_device(path)
+
+    def _on_write_error(self, writer, error):
+        self.registry.evict(writer.name, error)
+        self.registry.request_scan()
+
+    def _on_first_write(self, writer):
+        self.registry.write_succeeded(writer.name)
+
+    @property
+    def mapping(self):
+        if self.mapping_reloader is not None:
+            return self.mapping_reloader.mapping
+        return self.static_mapping
+
+    def _on_mapping_reload(self, mapping):
+        # Let the next result be written even if its state hasn't changed
+        self.last_command = None
+        self.group_commands.clear()
+
+    def _on_model_ready(self, future):
+        if future.exception() is None and self.current_color == MODEL_WARMING_COLOR:
+            self.set_color('off')
+
+    def set_color(self, color):
+        """Write a named color from COMMANDS to every device"""
+        self.last_command = COMMANDS.get(color, COMMANDS['off'])
+        self.writer.submit(self.last_command)
+        self.current_color = color
+
+    def play_program(self, steps, loop=True):
+        """Upload a multi-step program (busylight_protocol.Step list) in a single write"""
+        self.last_command = build_program(steps, loop=loop)
+        self.writer.submit(self.last_command)
+        self.current_color = 'program'
 
     def process_text(self, text):
         """Process text through emotion classification and speech"""
-        # Classify emotion
-        emotion, probs = self.emotion_classifier.classify(text)
+        with METRICS.span('process_text'):
+            return self._process_text(text)
+
+    def _process_text(self, text):
+        # Long (e.g. pasted) texts are scored window by window instead of truncated
+        timeline = None
+        if len(text) > LONG_TEXT_CHARS:
+            emotion, probs, timeline = self.emotion_classifier.classify_long(text)
+        else:
+            emotion, probs = self.emotion_classifier.classify(text)
+        if self.store is not None:
+            self.store.append(probs, source='gui')
         
         # Speak the text
-        self.tts.speak(text)
+        if self.tts is not None:
+            with METRICS.span('tts_dispatch'):
+                self.tts.speak(text)
         
-        # Set light color
-        self.set_emotion_color(emotion, probs)
+        # Set light color, or play the document's emotional arc when it has one
+        if timeline and len({segment['emotion'] for segment in timeline}) > 1:
+            self.last_command = timeline_animation(timeline)
+            self.writer.submit(self.last_command)
+            self.current_color = 'timeline'
+            self.display_state = (emotion, probs)
+            print(f"Playing emotion timeline over {len(timeline)} segments: {emotion} overall")
+        else:
+            with METRICS.span('light_update'):
+                self.set_emotion_color(emotion, probs)
         
         return emotion, probs
 
 
-    def set_emotion_color(self, emotion, probs):
-        """Set the light color based on detected emotion"""
-        """Set the light color based on detected emotion for all devices"""
+    def set_emotion_color(self, emotion, probs, group=None):
+        """Set the light color based on detected emotion for all devices, or one named group"""
+        names = None
+        tracker, last_command = self.emotion_state, self.last_command
+        if group is not None:
+            names = self.groups.resolve(group, self.registry.devices())
+            if not names:
+                print(f"No devices connected in group '{group}'")
+                return
+            if group not in self.group_states:
+                self.group_states[group] = EmotionStateTracker(self.emotion_classifier.labels)
+            tracker, last_command = self.group_states[group], self.group_commands.get(group)
+
+        # The lights follow the smoothed state, not the raw argmax
+        state, smoothed = tracker.update(probs)
+        if group is None:
+            # The on-screen swatch shows what the lights show
+            self.display_state = (state, smoothed)
         if not self.devices:
              print("No devices connected")
              return
+        mapping = self.mapping.for_group(group)
+        command = mapping.packet(state, smoothed)
+        color = mapping.describe(state)
 
-        color = EMOTION_COLORS.get(emotion, 'off')
-        command = COMMANDS.get(color, COMMANDS['off'])
-    
-        for i, device in enumerate(self.devices):
-            try:
-                 device.write(command)
-                 print(f"Set color for device {i}: {emotion} ({color}) - Confidence: {probs[emotion]*100:.1f}%")
-            except Exception as e:
-                print(f"Error setting color for device {i}: {e}")
+        target = 'all' if group is None else f"'{group}'"
+        if command == last_command:
+            tracker.record_write(False)
+            METRICS.inc('light_writes_skipped')
+            print(f"Light unchanged for {target}: {state} ({color}) - detected {emotion} at {probs[emotion]*100:.1f}%")
+            return
+
+        count = self.writer.submit(command, names=names)
+        tracker.record_write(True)
+        if group is None:
+            self.last_command = command
+            self.group_commands.clear()
+            self.current_color = color
+        else:
+            # Some lights no longer show the all-lights state
+            self.group_commands[group] = command
+            self.last_command = None
+        print(f"Set color for {count} device(s) in {target}: {state} ({color}) - Smoothed confidence: {smoothed[state]*100:.1f}%")
 
 
     def turn_off(self):
-        """Turn off the light"""
-        if self.device:
-            self.device.write(COMMANDS['off'])
+        """Turn off the lights, waiting briefly for the writes to land"""
+        if self.devices:
+            self.last_command = COMMANDS['off']
+            self.writer.submit(self.last_command)
+            self.writer.flush(timeout=1.0)
             self.current_color = 'off'
             print("Light turned off")
 
+# How long the event loop sleeps when nothing needs polling, and while
+# the microphone is live or the model is still warming up
+IDLE_TIMEOUT_MS = 1000
+ACTIVE_TIMEOUT_MS = 50
+BACKGROUND = (40, 40, 40)  # Dark gray background
+LIVE_RESULT = pygame.USEREVENT + 1  # Posted by the live classifier worker
+
+
 def main():
     pygame.init()
     screen = pygame.display.set_mode((800, 400))
     pygame.display.set_caption("Emotional Busylight Controller with Speech")
+    screen.fill(BACKGROUND)
+    pygame.display.flip()
+
+    # `kill -USR2 <pid>` toggles the stack sampler; timings are logged every few minutes
+    install_profile_signal()
+    METRICS.start_reporter(300)
     
-    # Initialize the Emotional Busylight
-    light = EmotionalBusylight()
+    # The history store has a single writer; a second front end runs without recording
+    try:
+        store = EmotionStore()
+    except StoreLockedError as e:
+        print(f"Not recording emotion history: {e}")
+        store = None
+
+    # Initialize the Emotional Busylight, sharing the inference daemon's model if one is running.
+    # Should the daemon go away mid-session, the client loads the model here instead.
+    classifier = connect_daemon(fallback=lambda model_name: EmotionClassifier(
+        model_name, cache=ClassificationCache(), load_in_background=True))
+    light = EmotionalBusylight(classifier=classifier, store=store)
     speech_input = SpeechInput()
 
+    # F2 toggles live mode: the light follows the text as it is typed
+    # The worker only posts the result; the lights are driven from this thread
+    def on_live_change(emotion, probs):
+        pygame.event.post(pygame.event.Event(LIVE_RESULT, result=(emotion, probs)))
+
+    live = LiveClassifier(light.emotion_classifier, on_live_change)
+    live_mode = False
+
     # Set up font for display
     font = pygame.font.Font(None, 36)
+    texts = TextCache(font)
+    frame_stats = FrameStats()
     input_text = ""
     input_active = False
     
     running = True
     last_analysis_time = 0
     emotion_result = None
+
+    def draw_text(surface, rect, state):
+        if state:
+            text, color = state
+            surface.blit(texts.render(text, color), rect.topleft)
+
+    def draw_swatch(surface, rect, rgb):
+        if rgb:
+            pygame.draw.rect(surface, rgb, rect)
+
+    def draw_input(surface, rect, state):
+        text, active = state
+        color = (255, 255, 255) if active else (128, 128, 128)
+        pygame.draw.rect(surface, color, rect, 2)
+        surface.blit(texts.render(text), (rect.x + 5, rect.y + 5))
+
+    def draw_mic(surface, rect, listening):
+        speech_input.draw_indicator(surface, pos=rect.center)
+
+    # Each region is redrawn only when the state it shows changes
+    regions = DirtyRegions(screen, BACKGROUND)
+    regions.add('status', (50, 50, 600, 36), draw_text)
+    regions.add('mic', (665, 15, 70, 70), draw_mic)
+    regions.add('emotion', (50, 100, 700, 36), draw_text)
+    regions.add('swatch', (50, 150, 300, 50), draw_swatch)
+    regions.add('instructions', (50, 250, 700, 36), draw_text)
+    regions.add('input', (50, 300, 700, 40), draw_input)
     
     while running:
+        # Sleep until there is input instead of polling on a fixed interval
+        polling = speech_input.busy or not light.emotion_classifier.is_ready
+        event = pygame.event.wait(ACTIVE_TIMEOUT_MS if polling else IDLE_TIMEOUT_MS)
+        events = [event] if event.type != pygame.NOEVENT else []
+        events.extend(pygame.event.get())
         current_time = pygame.time.get_ticks()
-        screen.fill((40, 40, 40))  # Dark gray background
-        
-           # Check for backtick key hold
-        keys = pygame.key.get_pressed()
-        speech_input.is_listening = keys[pygame.K_EQUALS]
-        
-        if speech_input.is_listening:
-            # Try to get speech input
-            spoken_text = speech_input.listen()
-            if spoken_text:
-                input_text += spoken_text + " "
-
-        #remove = from inpit text
-        input_text = input_text.replace("=", "")
-        # Draw text input box
-        input_box = pygame.Rect(50, 300, 700, 40)
-        color = (255, 255, 255) if input_active else (128, 128, 128)
-        pygame.draw.rect(screen, color, input_box, 2)
-        
-        # Render input text
-        txt_surface = font.render(input_text, True, (255, 255, 255))
-        screen.blit(txt_surface, (input_box.x + 5, input_box.y + 5))
         
-        # Draw instructions
-        instructions = font.render("Type, paste, or hold SPACE key for speak", True, (255, 255, 255))
-        screen.blit(instructions, (50, 250))
-        
-        speech_input.draw_indicator(screen)
-        # Display current emotion and color
-        if emotion_result:
-            emotion_text = font.render(f"Detected Emotion: {emotion_result[0]} ({emotion_result[1][emotion_result[0]]*100:.1f}%)", 
-                             True, (255, 255, 255))
-            screen.blit(emotion_text, (50, 100))
-    
-            color_name = EMOTION_COLORS.get(emotion_result[0], 'off')
-            rgb = COLOR_RGB.get(color_name, (40, 40, 40))
-            color_rect = pygame.Rect(50, 150, 300, 50)
-            pygame.draw.rect(screen, rgb, color_rect)
-        
-        pygame.display.flip()
-        
-        for event in pygame.event.get():
+        for event in events:
            
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                screen.fill(BACKGROUND)
+                pygame.display.flip()
+                regions.invalidate()
+            elif event.type == LIVE_RESULT:
+                if live_mode:
+                    emotion_result = event.result
+                    light.set_emotion_color(*event.result)
+            elif event.type == pygame.KEYUP and event.key == pygame.K_EQUALS:
+                speech_input.is_listening = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
+                elif event.key == pygame.K_EQUALS:
+                    # Hold = to speak
+                    speech_input.is_listening = True
+                elif event.key == pygame.K_F2:
+                    live_mode = not live_mode
+                    live.reset()
+                    print(f"Live mode {'on' if live_mode else 'off'}")
                 elif event.key == pygame.K_RETURN and input_text.strip():
                     if current_time - last_analysis_time >= 3000:
                         emotion_result = light.process_text(input_text)
                         input_text = ""
+                        live.reset()
                         last_analysis_time = current_time
                 # Add paste support (Ctrl+V)
                 elif event.key == pygame.K_v and pygame.key.get_mods() & pygame.KMOD_CTRL:
@@ -326,10 +878,37 @@ def main():
                     input_text = input_text[:-1]
                 else:
                     input_text += event.unicode
-        
-        sleep(0.1)
+
+        # Collect phrases the speech pipeline recognized in the background
+        spoken_text = speech_input.listen()
+        if spoken_text:
+            input_text += spoken_text + " "
+
+        if live_mode:
+            live.update(input_text)
+
+        frame_start = time.perf_counter()
+        states = {
+            'status': ("Model warming...", (160, 160, 160)) if not light.emotion_classifier.is_ready
+                      else ("Live mode (F2)", (160, 160, 160)) if live_mode else None,
+            'mic': speech_input.is_listening,
+            'instructions': ("Type, paste, or hold = key to speak", (255, 255, 255)),
+            'input': (input_text, input_active),
+        }
+        # Display current emotion and color
+        if emotion_result:
+            emotion, probs = emotion_result
+            states['emotion'] = (f"Detected Emotion: {emotion} ({probs[emotion]*100:.1f}%)",
+                                 (255, 255, 255))
+            # Draw the smoothed state the lights were set from, not this raw result
+            states['swatch'] = light.mapping.display_rgb(*(light.display_state or emotion_result))
+        dirty = regions.update(states)
+        frame_stats.record(time.perf_counter() - frame_start, bool(dirty))
     
     # Cleanup
+    print(f"Render stats: {frame_stats.summary()}")
+    print(f"Metrics: {METRICS.summary()}")
+    live.stop()
     light.turn_off()
     light.disconnect()
     pygame.quit()
@@ -0,0 +1,134 @@
+# busylight_animations.py
+
+"""
+On-device animations for the Busylight.
+
+Each pattern is compiled into the light's native program format (up to
+seven steps with repeat, on-time and off-time, see busylight_protocol.py)
+and uploaded in a single write. The light then plays the animation on its
+own, so the host sends nothing while it runs apart from keepalives.
+
+Colors are device intensities (0-100 per channel) or names from
+COLOR_INTENSITIES; times are in 0.1s units.
+"""
+
+import colorsys
+from functools import lru_cache
+
+from busylight_commands import COLOR_INTENSITIES, EMOTION_COLORS
+from busylight_protocol import Step, MAX_STEPS, MAX_INTENSITY, build_program
+
+
+def _resolve(color):
+    if isinstance(color, str):
+        if color not in COLOR_INTENSITIES:
+            raise ValueError(f"Unknown color '{color}'")
+        return COLOR_INTENSITIES[color]
+    return tuple(color)
+
+
+def _scale(rgb, level):
+    return tuple(min(MAX_INTENSITY, round(channel * level)) for channel in rgb)
+
+
+def solid(color):
+    """Steady color"""
+    r, g, b = _resolve(color)
+    return [Step(r, g, b, on_time=1, off_time=0)]
+
+
+def pulse(color, on_time=5, off_time=5):
+    """Blink between the color and dark"""
+    r, g, b = _resolve(color)
+    return [Step(r, g, b, on_time=on_time, off_time=off_time)]
+
+
+def breathe(color, period=20):
+    """Ramp brightness up and back down over roughly `period` tenths of a second"""
+    rgb = _resolve(color)
+    levels = [0.15, 0.4, 0.7, 1.0, 0.7, 0.4, 0.15][:MAX_STEPS]
+    step_time = max(1, round(period / len(levels)))
+    return [Step(*_scale(rgb, level), on_time=step_time, off_time=0) for level in levels]
+
+
+def rainbow(brightness=MAX_INTENSITY, step_time=5):
+    """Walk the hue wheel in seven steps"""
+    steps = []
+    for index in range(MAX_STEPS):
+        red, green, blue = colorsys.hsv_to_rgb(index / MAX_STEPS, 1.0, 1.0)
+        rgb = _scale((red, green, blue), brightness)
+        steps.append(Step(*rgb, on_time=step_time, off_time=0))
+    return steps
+
+
+def flicker(color, on_time=1, off_time=1, repeat=3, rest=10):
+    """Quick bursts of flashes separated by a pause"""
+    r, g, b = _resolve(color)
+    return [
+        Step(r, g, b, on_time=on_time, off_time=off_time, repeat=repeat),
+        Step(0, 0, 0, on_time=rest, off_time=0),
+    ]
+
+
+# Signature animation per emotion label
+EMOTION_ANIMATIONS = {
+    'anger': lambda: pulse('red', on_time=2, off_time=2),
+    'disgust': lambda: pulse('green', on_time=8, off_time=4),
+    'fear': lambda: flicker('purple'),
+    'joy': lambda: breathe('pink', period=14),
+    'neutral': lambda: solid('white'),
+    'sadness': lambda: breathe('cyan', period=40),
+    'surprise': lambda: flicker('orange', repeat=2, rest=6),
+}
+
+ANIMATIONS = {
+    'solid': solid,
+    'pulse': pulse,
+    'breathe': breathe,
+    'rainbow': rainbow,
+    'flicker': flicker,
+}
+
+
+def compile_animation(steps, loop=True):
+    """Turn a list of Steps into the single packet the light will play"""
+    return build_program(steps, loop=loop)
+
+
+@lru_cache(maxsize=None)
+def emotion_animation(emotion):
+    """Compiled signature packet for an emotion label (neutral for unknown labels)"""
+    factory = EMOTION_ANIMATIONS.get(emotion, EMOTION_ANIMATIONS['neutral'])
+    return compile_animation(factory())
+
+
+@lru_cache(maxsize=256)
+def animation_packet(name, *args):
+    """Compiled packet for a named pattern, e.g. animation_packet('breathe', 'pink')"""
+    if name not in ANIMATIONS:
+        raise ValueError(f"Unknown animation '{name}', expected one of {sorted(ANIMATIONS)}")
+    return compile_animation(ANIMATIONS[name](*args))
+
+
+def timeline_animation(timeline, step_time=10):
+    """Compile a classify_long() timeline into a looping light sequence.
+
+    Consecutive segments with the same emotion are merged; longer runs get a
+    proportionally longer on-time. Timelines with more than seven runs are
+    evenly downsampled to fit the device's program slots.
+    """
+    runs = []
+    for segment in timeline:
+        if runs and runs[-1][0] == segment['emotion']:
+            runs[-1][1] += 1
+        else:
+            runs.append([segment['emotion'], 1])
+    if len(runs) > MAX_STEPS:
+        picks = [round(i * (len(runs) - 1) / (MAX_STEPS - 1)) for i in range(MAX_STEPS)]
+        runs = [runs[i] for i in picks]
+
+    steps = []
+    for emotion, length in runs:
+        r, g, b = COLOR_INTENSITIES[EMOTION_COLORS.get(emotion, 'white')]
+        steps.append(Step(r, g, b, on_time=min(255, step_time * length), off_time=0))
+    return compile_animation(steps)
@@ -2,7 +2,7 @@
 
 """
 Command templates for the Busylight device.
-Each command is a 65-byte array that controls the light's behavior.
+Each command is a 65-byte packet (immutable bytes) that controls the light's behavior.
 
 Command structure:
 Byte 0: Command type (0x00 for light control)
@@ -16,147 +16,28 @@ Byte 7: OFF time (0x00 = no off time)
 Byte 8: Ringtone control (0x80 = no change)
 """
 
-# Command templates dictionary
-COMMANDS = {
-    'red': [
-        0x00, 0x10, 0x01, 0x64, 0x00, 0x00, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-    ],
-    'green': [
-        0x00, 0x10, 0x01, 0x22, 0x42, 0x00, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-    ],
-    'blue': [
-        0x00, 0x10, 0x01, 0x00, 0x00, 0x64, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-    ],
-    'yellow': [
-        0x00, 0x10, 0x01, 0x32, 0x32, 0x00, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-    ],
-    'purple': [
-        0x00, 0x10, 0x01, 0x32, 0x00, 0x32, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-    ],
-    'brown': [
-        0x00, 0x10, 0x01, 0x4B, 0x14, 0x05, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-    ],
+from busylight_packets import color_packet, keepalive_packet
 
-    'pink' : [
-
-        0x00, 0x10, 0x01, 0x3C, 0x0A, 0x1E, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-
-    ],
-    'orange': [
-
-        0x00, 0x10, 0x01, 0x52, 0x12, 0x00, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-    ],
-    'white': [
-        0x00, 0x10, 0x01, 0x22, 0x22, 0x20, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-        ],
-
-    'cyan': [
-        0x00, 0x10, 0x01, 0x00, 0x32, 0x32, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x04,
-        0x52
-    ],
-    'off': [
-        0x00, 0x10, 0x01, 0x00, 0x00, 0x00, 0x01, 0x00,
-        0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF, 0x03,
-        0xEE
-    ]
+# Device intensities (0x00-0x64) for each named color
+COLOR_INTENSITIES = {
+    'red': (0x64, 0x00, 0x00),
+    'green': (0x22, 0x42, 0x00),
+    'blue': (0x00, 0x00, 0x64),
+    'yellow': (0x32, 0x32, 0x00),
+    'purple': (0x32, 0x00, 0x32),
+    'brown': (0x4B, 0x14, 0x05),
+    'pink': (0x3C, 0x0A, 0x1E),
+    'orange': (0x52, 0x12, 0x00),
+    'white': (0x22, 0x22, 0x20),
+    'cyan': (0x00, 0x32, 0x32),
+    'off': (0x00, 0x00, 0x00),
 }
 
+# Ready-to-send 65-byte packets, built once from the template in busylight_packets
+COMMANDS = {name: color_packet(*rgb) for name, rgb in COLOR_INTENSITIES.items()}
+
 # Keep-alive command
-KEEPALIVE = [
-    0x00, 0x8f, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 
-    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-    0x00, 0x06, 0x04, 0x55, 0xff, 0xff, 0xff, 0x03, 
-    0xeb
-]
+KEEPALIVE = keepalive_packet()
 
 # RGB values for display purposes
 COLOR_RGB = {
@@ -169,6 +50,8 @@ COLOR_RGB = {
     'orange': (255, 165, 0),
     'brown': (139, 69, 19),
     'pink': (255, 192, 203),
+    'cyan': (0, 255, 255),
+    'off': (0, 0, 0),
 }
 
 # Emotion to color mapping
@@ -182,6 +65,13 @@ EMOTION_COLORS = {
     'surprise': 'orange'
 }
 
+# Shown on the lights while the emotion model loads
+MODEL_WARMING_COLOR = 'blue'
+
 # Device identifiers
 VENDOR_ID = 0x27BB
 PRODUCT_IDS = [0x3BCE, 0x3BCF]  # Alpha, Omega version
+BUSYLIGHT_MODELS = {
+    0x3BCE: "Busylight Alpha",
+    0x3BCF: "Busylight Omega",
+}
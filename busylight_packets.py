@@ -0,0 +1,92 @@
+# busylight_packets.py
+
+"""
+Builds ready-to-send Busylight packets as immutable `bytes`.
+
+Every solid-color packet is the same 65-byte template with only the RGB,
+on/off timing and checksum bytes patched, so building one is a copy and a
+handful of byte writes. PacketCache keeps those results around so the
+animation hot path never allocates for colors it has seen before.
+
+See busylight_protocol.py for the packet layout.
+"""
+
+import threading
+
+from busylight_protocol import (
+    PACKET_SIZE, MAX_INTENSITY, FOOTER, FOOTER_OFFSET, CHECKSUM_OFFSET,
+    OP_JUMP, OP_KEEPALIVE, RINGTONE_NONE, finalize,
+)
+
+# Offsets of the patched fields in step 0
+RED = 3
+GREEN = 4
+BLUE = 5
+ON_TIME = 6
+OFF_TIME = 7
+
+_TEMPLATE = bytearray(PACKET_SIZE)
+_TEMPLATE[1:9] = bytes([OP_JUMP, 0x01, 0x00, 0x00, 0x00, 0x01, 0x00, RINGTONE_NONE])
+_TEMPLATE[FOOTER_OFFSET:CHECKSUM_OFFSET] = FOOTER
+_TEMPLATE = bytes(_TEMPLATE)
+
+_KEEPALIVE_TEMPLATE = bytearray(PACKET_SIZE)
+_KEEPALIVE_TEMPLATE[FOOTER_OFFSET:CHECKSUM_OFFSET] = FOOTER
+_KEEPALIVE_TEMPLATE = bytes(_KEEPALIVE_TEMPLATE)
+
+
+def _check_intensity(name, value):
+    if not 0 <= value <= MAX_INTENSITY:
+        raise ValueError(f"{name} intensity must be 0-{MAX_INTENSITY}, got {value}")
+
+
+def color_packet(r, g, b, on_time=1, off_time=0):
+    """Solid (or blinking, with off_time) color packet; r/g/b are 0-100"""
+    _check_intensity('red', r)
+    _check_intensity('green', g)
+    _check_intensity('blue', b)
+    packet = bytearray(_TEMPLATE)
+    packet[RED] = r
+    packet[GREEN] = g
+    packet[BLUE] = b
+    packet[ON_TIME] = on_time
+    packet[OFF_TIME] = off_time
+    return finalize(packet)
+
+
+def rgb_to_intensity(rgb):
+    """Scale a 0-255 display RGB tuple to the device's 0-100 range"""
+    return tuple(round(channel * MAX_INTENSITY / 255) for channel in rgb)
+
+
+def keepalive_packet(timeout=0x0F):
+    """Keepalive packet telling the light to stay on for `timeout` seconds"""
+    packet = bytearray(_KEEPALIVE_TEMPLATE)
+    packet[1] = OP_KEEPALIVE | (timeout & 0x0F)
+    return finalize(packet)
+
+
+class PacketCache:
+    """Memoizes color_packet() results for the colors actually requested"""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self.packets = {}
+        self.lock = threading.Lock()
+
+    def get(self, r, g, b, on_time=1, off_time=0):
+        key = (r, g, b, on_time, off_time)
+        packet = self.packets.get(key)
+        if packet is None:
+            packet = color_packet(r, g, b, on_time, off_time)
+            with self.lock:
+                if len(self.packets) < self.max_entries:
+                    self.packets[key] = packet
+        return packet
+
+    def __len__(self):
+        return len(self.packets)
+
+
+# Shared cache used by the GUI and the emotion pipeline
+PACKETS = PacketCache()
@@ -0,0 +1,139 @@
+# busylight_protocol.py
+
+"""
+Busylight packet protocol: layout, checksum, validation and multi-step programs.
+
+A packet is 65 bytes. Byte 0 is the HID report id, bytes 1-56 hold seven
+8-byte program steps, bytes 57-62 are the sensitivity/timeout/trigger footer
+plus 0xFF padding, and bytes 63-64 are a big-endian 16-bit checksum: the sum
+of bytes 1-62.
+
+Each step is:
+Byte 0: Command - 0x10 | n jumps to step n after this step runs
+Byte 1: Repeat count
+Byte 2-4: Red, green, blue intensity (0x00-0x64)
+Byte 5: ON time (0x01 = 0.1s)
+Byte 6: OFF time (0x00 = no off time)
+Byte 7: Ringtone control (0x80 = no change)
+
+Chaining steps with jumps lets a whole animation be uploaded in one write
+and played by the light itself.
+"""
+
+from collections import namedtuple
+
+PACKET_SIZE = 65
+REPORT_ID = 0x00
+STEP_OFFSET = 1
+STEP_SIZE = 8
+MAX_STEPS = 7
+FOOTER_OFFSET = STEP_OFFSET + STEP_SIZE * MAX_STEPS  # 57
+CHECKSUM_OFFSET = 63
+MAX_INTENSITY = 0x64
+MAX_TIME = 0xFF  # On/off times are in 0.1s units
+
+FOOTER = bytes([0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF])
+
+# Step command opcodes (high nibble); the low nibble is the argument
+OP_JUMP = 0x10
+OP_KEEPALIVE = 0x80
+
+RINGTONE_NONE = 0x80
+
+
+class PacketError(ValueError):
+    """Raised for packets the device would reject or misinterpret"""
+
+
+Step = namedtuple('Step', ['r', 'g', 'b', 'on_time', 'off_time', 'repeat', 'ringtone'],
+                  defaults=(1, 0, 1, RINGTONE_NONE))
+Step.__doc__ = """One program step: intensities 0-100, times in 0.1s units"""
+
+
+def checksum(packet):
+    """16-bit checksum of bytes 1-62"""
+    return sum(packet[STEP_OFFSET:CHECKSUM_OFFSET]) & 0xFFFF
+
+
+def finalize(packet):
+    """Write the checksum into a packet and return it as immutable bytes"""
+    packet = bytearray(packet)
+    if len(packet) != PACKET_SIZE:
+        raise PacketError(f"Packet must be {PACKET_SIZE} bytes, got {len(packet)}")
+    total = checksum(packet)
+    packet[CHECKSUM_OFFSET] = total >> 8
+    packet[CHECKSUM_OFFSET + 1] = total & 0xFF
+    return bytes(packet)
+
+
+def validate_packet(packet):
+    """Raise PacketError if the packet is malformed; returns it as bytes otherwise"""
+    packet = bytes(packet)
+    if len(packet) != PACKET_SIZE:
+        raise PacketError(f"Packet must be {PACKET_SIZE} bytes, got {len(packet)}")
+    if packet[0] != REPORT_ID:
+        raise PacketError(f"Unexpected report id 0x{packet[0]:02X}")
+
+    expected = checksum(packet)
+    actual = (packet[CHECKSUM_OFFSET] << 8) | packet[CHECKSUM_OFFSET + 1]
+    if expected != actual:
+        raise PacketError(f"Bad checksum 0x{actual:04X}, expected 0x{expected:04X}")
+
+    for index in range(MAX_STEPS):
+        start = STEP_OFFSET + index * STEP_SIZE
+        command = packet[start]
+        if command & 0xF0 == OP_JUMP:
+            if command & 0x0F >= MAX_STEPS:
+                raise PacketError(f"Step {index} jumps to missing step {command & 0x0F}")
+            for channel, value in zip('RGB', packet[start + 2:start + 5]):
+                if value > MAX_INTENSITY:
+                    raise PacketError(f"Step {index} {channel} intensity {value} exceeds {MAX_INTENSITY}")
+    return packet
+
+
+def _encode_step(step, jump_to):
+    for channel in (step.r, step.g, step.b):
+        if not 0 <= channel <= MAX_INTENSITY:
+            raise PacketError(f"Intensity must be 0-{MAX_INTENSITY}, got {channel}")
+    for value in (step.on_time, step.off_time, step.repeat):
+        if not 0 <= value <= MAX_TIME:
+            raise PacketError(f"Step timing/repeat must be 0-{MAX_TIME}, got {value}")
+    return bytes([OP_JUMP | jump_to, step.repeat, step.r, step.g, step.b,
+                  step.on_time, step.off_time, step.ringtone])
+
+
+def build_program(steps, loop=True):
+    """Pack up to seven steps into one packet.
+
+    Each step jumps to the next one. With loop=True the last step jumps back
+    to the first so the light plays the sequence forever; otherwise it jumps
+    to itself and holds its color.
+    """
+    steps = list(steps)
+    if not 1 <= len(steps) <= MAX_STEPS:
+        raise PacketError(f"A program holds 1-{MAX_STEPS} steps, got {len(steps)}")
+
+    packet = bytearray(PACKET_SIZE)
+    last = len(steps) - 1
+    for index, step in enumerate(steps):
+        if index < last:
+            jump_to = index + 1
+        else:
+            jump_to = 0 if loop else last
+        start = STEP_OFFSET + index * STEP_SIZE
+        packet[start:start + STEP_SIZE] = _encode_step(step, jump_to)
+    packet[FOOTER_OFFSET:CHECKSUM_OFFSET] = FOOTER
+    return finalize(packet)
+
+
+def decode_packet(packet):
+    """Decode a packet back into (jump_target, Step) pairs for its active steps"""
+    packet = validate_packet(packet)
+    steps = []
+    for index in range(MAX_STEPS):
+        start = STEP_OFFSET + index * STEP_SIZE
+        command, repeat, r, g, b, on_time, off_time, ringtone = packet[start:start + STEP_SIZE]
+        if command & 0xF0 != OP_JUMP:
+            continue
+        steps.append((command & 0x0F, Step(r, g, b, on_time, off_time, repeat, ringtone)))
+    return steps
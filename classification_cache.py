@@ -0,0 +1,190 @@
+# classification_cache.py
+
+"""
+Content-addressed cache for emotion classification results.
+
+Entries are keyed by a SHA-256 of the model name and the normalized text and
+hold the probability row produced by EmotionClassifier. The in-memory tier is
+a bounded LRU with optional TTL; an optional sqlite file acts as a second tier
+so results survive restarts. The sqlite tier is bounded too (the oldest rows
+go first) and its writes are batched: puts queue up and are committed in one
+transaction every `commit_every` rows or `commit_interval` seconds, and on
+close/exit.
+"""
+
+import atexit
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text):
+    """Normalize text so trivially different inputs share a cache entry"""
+    text = unicodedata.normalize('NFC', text)
+    return ' '.join(text.split())
+
+
+def cache_key(text, model_name):
+    """Hash of the model name and normalized text"""
+    payload = f"{model_name}\x00{normalize_text(text)}".encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ClassificationCache:
+    def __init__(self, max_entries=10000, ttl=None, disk_path=None, max_disk_entries=100000,
+                 commit_every=64, commit_interval=1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (created_at, probs)
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_evictions = 0
+
+        self.db = None
+        self.max_disk_entries = max_disk_entries
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.pending = {}  # key -> (created_at, probs bytes) not yet written to sqlite
+        self.last_commit = time.monotonic()
+        if disk_path:
+            self.db = sqlite3.connect(disk_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, created REAL NOT NULL, probs BLOB NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+            self.db.commit()
+            with self.lock:
+                self._prune_disk(time.time())
+                self.db.commit()
+            atexit.register(self.close)  # Don't lose the last batch of puts
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, key):
+        """Return the cached probability row for key, or None"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+
+            row = self._disk_get(key, now)
+            if row is not None:
+                self._store(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[1]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, probs):
+        """Store a probability row in both tiers"""
+        probs = np.asarray(probs, dtype=np.float32).copy()
+        probs.setflags(write=False)
+        now = time.time()
+        with self.lock:
+            self._store(key, now, probs)
+            if self.db is not None:
+                self.pending[key] = (now, probs.tobytes())
+                if (len(self.pending) >= self.commit_every
+                        or time.monotonic() - self.last_commit >= self.commit_interval):
+                    self._flush()
+
+    def flush(self):
+        """Write queued puts to the sqlite tier now"""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.db is None:
+            return
+        if self.pending:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO results (key, created, probs) VALUES (?, ?, ?)",
+                [(key, created, blob) for key, (created, blob) in self.pending.items()],
+            )
+            self.pending.clear()
+            self._prune_disk(time.time())
+        self.db.commit()
+        self.last_commit = time.monotonic()
+
+    def _prune_disk(self, now):
+        """Delete expired rows and the oldest rows beyond max_disk_entries (caller commits)"""
+        if self.ttl is not None:
+            cursor = self.db.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+            self.disk_evictions += max(cursor.rowcount, 0)
+        if self.max_disk_entries is not None:
+            count = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            if count > self.max_disk_entries:
+                cursor = self.db.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY created LIMIT ?)",
+                    (count - self.max_disk_entries,),
+                )
+                self.disk_evictions += max(cursor.rowcount, 0)
+
+    def _store(self, key, created_at, probs):
+        self.entries[key] = (created_at, probs)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key, now):
+        if self.db is None:
+            return None
+        row = self.pending.get(key)
+        if row is None:
+            row = self.db.execute(
+                "SELECT created, probs FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or self._expired(row[0], now):
+            return None  # Expired rows are deleted in bulk by _prune_disk
+        probs = np.frombuffer(row[1], dtype=np.float32)
+        return row[0], probs
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self.lock:
+            self.entries.clear()
+            self.pending.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM results")
+                self.db.commit()
+
+    def stats(self):
+        """Hit/miss/eviction counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self._flush()
+                self.db.close()
+                self.db = None
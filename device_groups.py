@@ -0,0 +1,117 @@
+# device_groups.py
+
+"""
+Named groups of lights and routing of message sources to them.
+
+A group is a list of selectors, each matching a light by HID path or by
+serial number, so one host can drive lights for several teams. SourceRouter
+maps message sources (channels, users, ...) to group names with exact
+matches first, then shell-style patterns, then a default.
+
+Both are usually loaded from one JSON file:
+
+    {
+        "groups": {
+            "platform": ["SN-0012", "SN-0013"],
+            "support": ["/dev/hidraw4"]
+        },
+        "routes": {
+            "#platform": "platform",
+            "#support-*": "support",
+            "user:alice": ["platform", "support"]
+        },
+        "default": null
+    }
+"""
+
+import fnmatch
+import json
+
+
+def _as_text(value):
+    return value.decode(errors='replace') if isinstance(value, bytes) else str(value)
+
+
+class DeviceGroups:
+    def __init__(self, groups=None):
+        self.groups = {}  # name -> set of path/serial selectors
+        for name, selectors in (groups or {}).items():
+            self.add(name, selectors)
+
+    def add(self, name, selectors):
+        if isinstance(selectors, (str, bytes)):
+            selectors = [selectors]
+        self.groups[name] = {_as_text(selector) for selector in selectors}
+
+    def remove(self, name):
+        self.groups.pop(name, None)
+
+    def names(self):
+        return list(self.groups)
+
+    def __contains__(self, name):
+        return name in self.groups
+
+    def matches(self, name, light):
+        """Whether a DeviceRegistry light record belongs to group `name`"""
+        selectors = self.groups.get(name, ())
+        serial = light['info'].get('serial_number')
+        return _as_text(light['path']) in selectors or (serial is not None and serial in selectors)
+
+    def resolve(self, name, lights):
+        """Paths of the lights in group `name`, given DeviceRegistry.devices()"""
+        if name not in self.groups:
+            raise KeyError(f"Unknown device group '{name}'")
+        return [light['path'] for light in lights if self.matches(name, light)]
+
+    def groups_of(self, light):
+        return [name for name in self.groups if self.matches(name, light)]
+
+
+class SourceRouter:
+    def __init__(self, routes=None, default=None):
+        self.exact = {}
+        self.patterns = []  # (pattern, groups), in insertion order
+        for source, groups in (routes or {}).items():
+            self.add(source, groups)
+        self.default = self._as_groups(default)
+
+    @staticmethod
+    def _as_groups(groups):
+        if groups is None:
+            return []
+        return [groups] if isinstance(groups, str) else list(groups)
+
+    def add(self, source, groups):
+        groups = self._as_groups(groups)
+        if any(ch in source for ch in '*?['):
+            self.patterns.append((source, groups))
+        else:
+            self.exact[source] = groups
+
+    def route(self, source):
+        """Group names a message from `source` should be shown on"""
+        if source in self.exact:
+            return self.exact[source]
+        for pattern, groups in self.patterns:
+            if fnmatch.fnmatchcase(source, pattern):
+                return groups
+        return self.default
+
+
+def load_routing(path):
+    """Read a routing file; returns (DeviceGroups, SourceRouter)"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    groups = DeviceGroups(config.get('groups', {}))
+    router = SourceRouter(config.get('routes', {}), config.get('default'))
+    for source, names in list(router.exact.items()) + router.patterns:
+        unknown = [name for name in names if name not in groups]
+        if unknown:
+            raise ValueError(f"{path}: route '{source}' uses unknown group(s) {unknown}")
+    unknown = [name for name in router.default if name not in groups]
+    if unknown:
+        raise ValueError(f"{path}: default uses unknown group(s) {unknown}")
+    return groups, router
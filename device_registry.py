@@ -0,0 +1,215 @@
+# device_registry.py
+
+"""
+Hot-plug aware registry of connected Busylights.
+
+A background watcher re-enumerates the bus every scan_interval seconds (or
+straight away when request_scan() is called, e.g. after a write failure),
+diffs the set of device paths against what is open, opens new lights and
+evicts ones that disappeared. A path that fails to open is retried with
+exponential backoff instead of on every scan. So is a light whose writes
+fail while it stays enumerated: its backoff keeps doubling across evictions
+until write_succeeded() reports that a reopened handle took a write.
+
+on_connect(path, device) and on_disconnect(path) are called from whichever
+thread made the change, outside the registry lock.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import hid
+
+from busylight_commands import VENDOR_ID, PRODUCT_IDS, BUSYLIGHT_MODELS
+from metrics import METRICS
+
+
+class DeviceRegistry:
+    def __init__(self, hid_backend=hid, vendor_id=VENDOR_ID, product_ids=PRODUCT_IDS,
+                 scan_interval=2.0, min_backoff=0.5, max_backoff=30.0,
+                 on_connect=None, on_disconnect=None):
+        self.hid = hid_backend  # The hid module, or fake_hid.FakeHIDBackend for testing
+        self.vendor_id = vendor_id
+        self.product_ids = list(product_ids)
+        self.scan_interval = scan_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+
+        self.lights = OrderedDict()  # path -> {'info', 'model', 'device', 'path'}
+        self.retry = {}              # path -> (next attempt time, current backoff)
+        self.write_backoff = {}      # path -> backoff after write failures, until a write succeeds
+        self.lock = threading.RLock()
+        self.scan_requested = threading.Event()
+        self.running = False
+        self.watcher = None
+
+        # Statistics
+        self.scans = 0
+        self.connects = 0
+        self.evictions = 0
+        self.open_failures = 0
+
+    def enumerate(self):
+        """Busylights currently on the bus as {path: (product_id, device_info)}"""
+        found = OrderedDict()
+        for pid in self.product_ids:
+            for device_info in self.hid.enumerate(self.vendor_id, pid):
+                found[device_info['path']] = (pid, device_info)
+        return found
+
+    def scan(self):
+        """Diff the bus against open devices; returns (added paths, removed paths)"""
+        try:
+            found = self.enumerate()
+        except Exception as e:
+            print(f"Busylight enumeration failed: {e}")
+            return [], []
+
+        now = time.monotonic()
+        with self.lock:
+            self.scans += 1
+            removed = [path for path in self.lights if path not in found]
+            candidates = [(path, pid, info) for path, (pid, info) in found.items()
+                          if path not in self.lights
+                          and self.retry.get(path, (0.0, 0.0))[0] <= now]
+            # Forget backoff for lights that were unplugged before they could be opened
+            for path in list(self.retry):
+                if path not in found:
+                    del self.retry[path]
+
+        for path in removed:
+            self.evict(path)
+
+        added = []
+        for path, pid, info in candidates:
+            if self._open(path, pid, info):
+                added.append(path)
+        return added, removed
+
+    def _open(self, path, pid, info):
+        try:
+            device = self.hid.device()
+            device.open_path(path)
+        except Exception as e:
+            with self.lock:
+                self.open_failures += 1
+                _, backoff = self.retry.get(path, (0.0, 0.0))
+                backoff = min(self.max_backoff, backoff * 2 if backoff else self.min_backoff)
+                self.retry[path] = (time.monotonic() + backoff, backoff)
+            METRICS.inc('device_open_failures')
+            print(f"Failed to connect to device {path!r}, retrying in {backoff:.1f}s: {e}")
+            return False
+
+        light = {
+            'info': info,
+            'model': BUSYLIGHT_MODELS.get(pid, "Busylight"),
+            'device': device,
+            'path': path,
+        }
+        with self.lock:
+            self.lights[path] = light
+            self.retry.pop(path, None)
+            self.connects += 1
+        METRICS.inc('device_connects')
+        print(f"Connected to {light['model']} at {path!r}")
+        if self.on_connect is not None:
+            self.on_connect(path, device)
+        return True
+
+    def evict(self, path, error=None):
+        """Drop a dead or unplugged device and close its handle"""
+        with self.lock:
+            light = self.lights.pop(path, None)
+            if light is None:
+                return False
+            self.evictions += 1
+            if error is not None:
+                # It failed while still enumerated; don't reopen it on the very next scan,
+                # and back off further each time a reopened handle fails again
+                backoff = self.write_backoff.get(path)
+                backoff = min(self.max_backoff, backoff * 2) if backoff else self.min_backoff
+                self.write_backoff[path] = backoff
+                self.retry[path] = (time.monotonic() + backoff, backoff)
+            else:
+                # Unplugged: whatever comes back on this path starts afresh
+                self.write_backoff.pop(path, None)
+        METRICS.inc('device_evictions')
+        try:
+            light['device'].close()
+        except Exception:
+            pass
+        print(f"Busylight at {path!r} disconnected" + (f": {error}" if error else ""))
+        if self.on_disconnect is not None:
+            self.on_disconnect(path)
+        return True
+
+    def write_succeeded(self, path):
+        """A light took a write, so it is healthy again; its next failure starts at min_backoff"""
+        with self.lock:
+            self.write_backoff.pop(path, None)
+
+    def request_scan(self):
+        """Wake the watcher for an immediate re-enumeration"""
+        self.scan_requested.set()
+
+    def start(self):
+        if self.watcher is not None:
+            return
+        self.running = True
+        self.watcher = threading.Thread(target=self._watch_loop, daemon=True, name="busylight-watcher")
+        self.watcher.start()
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        self.scan_requested.set()
+        if self.watcher is not None:
+            self.watcher.join(timeout=timeout)
+            self.watcher = None
+
+    def _watch_loop(self):
+        while self.running:
+            self.scan_requested.wait(self.scan_interval)
+            self.scan_requested.clear()
+            if self.running:
+                self.scan()
+
+    def close_all(self):
+        """Close every handle without firing on_disconnect (used at shutdown)"""
+        with self.lock:
+            lights = list(self.lights.values())
+            self.lights.clear()
+        for light in lights:
+            try:
+                light['device'].close()
+            except Exception:
+                pass
+
+    def devices(self):
+        """Snapshot of the connected lights, in connection order"""
+        with self.lock:
+            return list(self.lights.values())
+
+    def handles(self):
+        with self.lock:
+            return [light['device'] for light in self.lights.values()]
+
+    def paths(self):
+        with self.lock:
+            return list(self.lights)
+
+    def __len__(self):
+        return len(self.lights)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'connected': len(self.lights),
+                'scans': self.scans,
+                'connects': self.connects,
+                'evictions': self.evictions,
+                'open_failures': self.open_failures,
+                'backing_off': len(self.retry),
+            }
@@ -0,0 +1,287 @@
+# emotion_mapping.py
+
+"""
+Declarative emotion-to-light mapping, compiled into lookup tables.
+
+A mapping file (JSON, or TOML on Python 3.11+) says what each emotion looks
+like. Anything left out falls back to EMOTION_COLORS:
+
+    {
+        "mode": "solid",
+        "emotions": {
+            "anger":   {"color": "red", "animation": {"name": "pulse", "on_time": 2, "off_time": 2}},
+            "joy":     {"color": [255, 105, 180]},
+            "sadness": {"color": "cyan", "animation": "signature"}
+        },
+        "groups": {
+            "support": {"mode": "blend", "blend_power": 2.0}
+        }
+    }
+
+Colors are names from COLOR_INTENSITIES or display RGB triples (0-255),
+both for an emotion and for an animation's "color" option.
+An animation is a pattern name from busylight_animations.ANIMATIONS, a
+{"name": ..., <pattern options>} table, or "signature" for the emotion's
+built-in animation. In "solid" mode the smoothed state's packet is looked up
+in a table built at load time. In "blend" mode the light shows the average of
+all emotion colors weighted by the probability vector (raised to
+blend_power, to favor the leader). The blend is one matrix product, and
+packets come from the shared PacketCache. Groups override any top-level key
+for the lights of one device group.
+
+MappingReloader watches the file and swaps in a freshly compiled mapping in a
+single assignment, so readers always see either the old or the new table. A
+file that fails validation is reported and the old mapping stays in place.
+"""
+
+import inspect
+import json
+import os
+import threading
+
+import numpy as np
+
+from busylight_animations import ANIMATIONS, EMOTION_ANIMATIONS, compile_animation
+from busylight_commands import COLOR_INTENSITIES, COLOR_RGB, COMMANDS, EMOTION_COLORS
+from busylight_packets import PACKETS, rgb_to_intensity
+from busylight_protocol import MAX_INTENSITY, PacketError
+
+DEFAULT_LABELS = ['anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise']
+MODES = ('solid', 'blend')
+_TOP_LEVEL_KEYS = {'mode', 'blend_power', 'emotions', 'groups'}
+_EMOTION_KEYS = {'color', 'animation'}
+
+
+class MappingError(ValueError):
+    """A mapping config that can't be compiled"""
+
+
+def default_config(animate=False):
+    """The built-in mapping: EMOTION_COLORS, optionally with each emotion's signature animation"""
+    emotions = {}
+    for label, color in EMOTION_COLORS.items():
+        emotions[label] = {'color': color}
+        if animate:
+            emotions[label]['animation'] = 'signature'
+    return {'mode': 'solid', 'emotions': emotions}
+
+
+def _resolve_color(spec, where):
+    """Device intensities and display RGB for a color name or a [r, g, b] display triple"""
+    if isinstance(spec, str):
+        if spec not in COLOR_INTENSITIES:
+            raise MappingError(f"{where}: unknown color '{spec}', expected one of {sorted(COLOR_INTENSITIES)}")
+        intensity = COLOR_INTENSITIES[spec]
+        display = COLOR_RGB.get(spec, tuple(round(c * 255 / MAX_INTENSITY) for c in intensity))
+        return intensity, display
+    if (isinstance(spec, (list, tuple)) and len(spec) == 3
+            and all(isinstance(c, int) and not isinstance(c, bool) and 0 <= c <= 255 for c in spec)):
+        return rgb_to_intensity(spec), tuple(spec)
+    raise MappingError(f"{where}: color must be a name or three integers 0-255, got {spec!r}")
+
+
+def _compile_animation(spec, label, intensity, where):
+    if spec == 'signature':
+        if label not in EMOTION_ANIMATIONS:
+            raise MappingError(f"{where}: no signature animation for '{label}'")
+        steps = EMOTION_ANIMATIONS[label]()
+    else:
+        if isinstance(spec, str):
+            spec = {'name': spec}
+        if not isinstance(spec, dict) or spec.get('name') not in ANIMATIONS:
+            raise MappingError(f"{where}: animation must be 'signature' or one of {sorted(ANIMATIONS)}, "
+                               f"got {spec!r}")
+        pattern = ANIMATIONS[spec['name']]
+        options = {key: value for key, value in spec.items() if key != 'name'}
+        # Patterns that take a color get the emotion's color unless one is given; a given
+        # one is a name or display RGB like the top-level color, so convert it the same way
+        if 'color' in options:
+            options['color'] = _resolve_color(options['color'], f"{where}.animation")[0]
+        elif 'color' in inspect.signature(pattern).parameters:
+            options['color'] = intensity
+        try:
+            steps = pattern(**options)
+        except (TypeError, ValueError) as e:
+            raise MappingError(f"{where}: bad options for animation '{spec['name']}': {e}")
+    try:
+        return compile_animation(steps)
+    except PacketError as e:
+        raise MappingError(f"{where}: animation does not fit the device: {e}")
+    except (TypeError, ValueError) as e:
+        raise MappingError(f"{where}: bad options for animation {spec!r}: {e}")
+
+
+class EmotionMapping:
+    """A compiled mapping: per-label packets, a blend matrix and per-group overrides"""
+
+    def __init__(self, config, labels=DEFAULT_LABELS, where='mapping', base=None):
+        if not isinstance(config, dict):
+            raise MappingError(f"{where}: expected a table, got {type(config).__name__}")
+        unknown = set(config) - _TOP_LEVEL_KEYS
+        if unknown:
+            raise MappingError(f"{where}: unknown key(s) {sorted(unknown)}")
+        if base is not None and 'groups' in config:
+            raise MappingError(f"{where}: groups can't be nested")
+
+        self.labels = list(labels)
+        self.mode = config.get('mode', base.mode if base else 'solid')
+        if self.mode not in MODES:
+            raise MappingError(f"{where}: mode must be one of {MODES}, got {self.mode!r}")
+        self.blend_power = config.get('blend_power', base.blend_power if base else 1.0)
+        if (not isinstance(self.blend_power, (int, float)) or isinstance(self.blend_power, bool)
+                or self.blend_power <= 0):
+            raise MappingError(f"{where}: blend_power must be a positive number")
+
+        emotions = config.get('emotions', {})
+        if not isinstance(emotions, dict):
+            raise MappingError(f"{where}.emotions: expected a table")
+        unknown = set(emotions) - set(self.labels)
+        if unknown:
+            raise MappingError(f"{where}.emotions: unknown emotion(s) {sorted(unknown)}")
+
+        self.packets = {}    # label -> packet for solid mode
+        self.names = {}      # label -> color name (or 'custom') for logging
+        self.display = {}    # label -> 0-255 RGB for on-screen swatches
+        self.intensities = np.zeros((len(self.labels), 3), dtype=np.float32)
+        for index, label in enumerate(self.labels):
+            entry = emotions.get(label)
+            if entry is None and base is not None:
+                self.packets[label] = base.packets[label]
+                self.names[label] = base.names[label]
+                self.display[label] = base.display[label]
+                self.intensities[index] = base.intensities[index]
+                continue
+            entry = entry or {}
+            spot = f"{where}.emotions.{label}"
+            if not isinstance(entry, dict):
+                raise MappingError(f"{spot}: expected a table")
+            unknown = set(entry) - _EMOTION_KEYS
+            if unknown:
+                raise MappingError(f"{spot}: unknown key(s) {sorted(unknown)}")
+            color = entry.get('color', EMOTION_COLORS.get(label, 'white'))
+            intensity, display = _resolve_color(color, spot)
+            self.names[label] = color if isinstance(color, str) else 'custom'
+            self.display[label] = display
+            self.intensities[index] = intensity
+            if 'animation' in entry:
+                self.packets[label] = _compile_animation(entry['animation'], label, intensity, spot)
+            else:
+                self.packets[label] = PACKETS.get(*intensity)
+
+        groups = config.get('groups', {})
+        if not isinstance(groups, dict):
+            raise MappingError(f"{where}.groups: expected a table")
+        self.groups = {}
+        for name, override in groups.items():
+            self.groups[name] = EmotionMapping(override, self.labels, f"{where}.groups.{name}", base=self)
+
+    def for_group(self, group):
+        """The mapping to use for a device group (the top-level one if it has no override)"""
+        return self.groups.get(group, self) if group is not None else self
+
+    def _as_matrix(self, probs):
+        if isinstance(probs, dict):
+            probs = [probs.get(label, 0.0) for label in self.labels]
+        return np.atleast_2d(np.asarray(probs, dtype=np.float32))
+
+    def blend(self, probs):
+        """Device intensities for one or many probability vectors; returns (N, 3) ints"""
+        weights = self._as_matrix(probs)
+        if self.blend_power != 1:
+            weights = weights ** self.blend_power
+        totals = weights.sum(axis=1, keepdims=True)
+        weights = weights / np.where(totals > 0, totals, 1)
+        return np.clip(np.rint(weights @ self.intensities), 0, MAX_INTENSITY).astype(np.int64)
+
+    def packet(self, label, probs=None):
+        """Packet to show for a state label (and, in blend mode, its probability vector)"""
+        if self.mode == 'blend' and probs is not None:
+            r, g, b = self.blend(probs)[0]
+            return PACKETS.get(int(r), int(g), int(b))
+        return self.packets.get(label, COMMANDS['off'])
+
+    def describe(self, label):
+        return 'blend' if self.mode == 'blend' else self.names.get(label, 'off')
+
+    def display_rgb(self, label, probs=None):
+        """0-255 RGB for drawing the state on screen"""
+        if self.mode == 'blend' and probs is not None:
+            return tuple(round(int(c) * 255 / MAX_INTENSITY) for c in self.blend(probs)[0])
+        return self.display.get(label, (0, 0, 0))
+
+
+def read_config(path):
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            raise MappingError("TOML mappings need Python 3.11+") from None
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_mapping(path, labels=DEFAULT_LABELS):
+    """Read and compile a mapping file; raises MappingError if it is invalid"""
+    try:
+        config = read_config(path)
+    except (OSError, ValueError) as e:
+        raise MappingError(f"{path}: {e}")
+    return EmotionMapping(config, labels, where=os.path.basename(path))
+
+
+class MappingReloader:
+    """Keeps `mapping` in sync with a file, recompiling it when the file changes"""
+
+    def __init__(self, path, labels=DEFAULT_LABELS, on_reload=None):
+        self.path = path
+        self.labels = labels
+        self.on_reload = on_reload  # Called with the new EmotionMapping after each swap
+        self.mapping = load_mapping(path, labels)
+        self.mtime = os.path.getmtime(path)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.reloads = 0
+        self.failures = 0
+
+    def reload(self):
+        """Compile the file and swap it in; returns False (keeping the old mapping) on errors"""
+        try:
+            self.mtime = os.path.getmtime(self.path)
+            mapping = load_mapping(self.path, self.labels)
+        except (OSError, MappingError) as e:
+            self.failures += 1
+            print(f"Keeping the previous emotion mapping: {e}")
+            return False
+        self.mapping = mapping
+        self.reloads += 1
+        print(f"Reloaded emotion mapping from {self.path}")
+        if self.on_reload is not None:
+            self.on_reload(mapping)
+        return True
+
+    def start(self, interval=2.0):
+        """Poll the file's modification time from a daemon thread"""
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._watch_loop, args=(interval,), daemon=True,
+                                       name="mapping-reloader")
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _watch_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            try:
+                changed = os.path.getmtime(self.path) != self.mtime
+            except OSError:
+                continue
+            if changed:
+                try:
+                    self.reload()
+                except Exception as e:
+                    # Keep watching: the next save may well fix whatever broke this one
+                    self.failures += 1
+                    print(f"Emotion mapping reload failed: {type(e).__name__}: {e}")
@@ -0,0 +1,87 @@
+# emotion_state.py
+
+"""
+Temporal smoothing and hysteresis for the emotion shown on the lights.
+
+Classifier outputs are folded into an exponential moving average, and the
+displayed state only moves to a new label once that label leads the current
+one by switch_margin in the average. Near-ties and one-off outliers therefore
+no longer flip the light back and forth. The tracker also counts how many
+light writes were skipped because the state, and so the color, was unchanged.
+"""
+
+import threading
+
+import numpy as np
+
+
+class EmotionStateTracker:
+    def __init__(self, labels, alpha=0.6, switch_margin=0.15):
+        self.labels = list(labels)
+        self.alpha = alpha  # Weight of the newest result in the moving average
+        self.switch_margin = switch_margin
+        self.lock = threading.Lock()
+        self.smoothed = None
+        self.state = None
+
+        # Statistics
+        self.updates = 0
+        self.switches = 0
+        self.suppressed = 0
+        self.writes = 0
+        self.writes_skipped = 0
+
+    def _as_array(self, probs):
+        if isinstance(probs, dict):
+            return np.array([probs.get(label, 0.0) for label in self.labels], dtype=np.float32)
+        return np.asarray(probs, dtype=np.float32)
+
+    def update(self, probs):
+        """Fold in one probability vector (array or {label: prob}); returns (state, {label: smoothed})"""
+        probs = self._as_array(probs)
+        with self.lock:
+            self.updates += 1
+            if self.smoothed is None:
+                self.smoothed = probs.copy()
+            else:
+                self.smoothed = self.alpha * probs + (1 - self.alpha) * self.smoothed
+
+            leader = int(self.smoothed.argmax())
+            if self.state is None:
+                self.state = leader
+                self.switches += 1
+            elif leader != self.state:
+                if self.smoothed[leader] - self.smoothed[self.state] >= self.switch_margin:
+                    self.state = leader
+                    self.switches += 1
+                else:
+                    self.suppressed += 1
+
+            smoothed = {label: float(p) for label, p in zip(self.labels, self.smoothed)}
+            return self.labels[self.state], smoothed
+
+    def record_write(self, written):
+        """Count a light update that was either sent or skipped as redundant"""
+        with self.lock:
+            if written:
+                self.writes += 1
+            else:
+                self.writes_skipped += 1
+
+    def reset(self):
+        with self.lock:
+            self.smoothed = None
+            self.state = None
+
+    def stats(self):
+        with self.lock:
+            requested = self.writes + self.writes_skipped
+            return {
+                'state': self.labels[self.state] if self.state is not None else None,
+                'updates': self.updates,
+                'switches': self.switches,
+                'suppressed_switches': self.suppressed,
+                'writes': self.writes,
+                'writes_skipped': self.writes_skipped,
+                'write_avoidance': self.writes_skipped / requested if requested else 0.0,
+            }
@@ -0,0 +1,286 @@
+# emotion_store.py
+
+"""
+Append-only, columnar history of classification results.
+
+Each result becomes one fixed-width row spread over three column files in
+the store directory:
+
+    timestamps.f8   float64 Unix time
+    sources.u4      uint32 source id (names in meta.json)
+    probs.f4        float32 x len(labels) probabilities
+
+Timestamps are float64 because float32 only resolves Unix times to about two
+minutes. Appends go straight to the end of each file; reads memory-map the
+columns, so the rollups below run as NumPy reductions over millions of rows
+without building Python objects per row. Rows are expected in time order
+(they are appended as results arrive), which lets time ranges be found with
+a binary search.
+
+A store has one writer: opening it writable takes an exclusive lock on
+writer.lock and a second writer gets StoreLockedError. Readers
+(writable=False) never modify the files and only see rows that are complete
+in all three columns, so they are safe to open while the writer appends.
+
+    python emotion_store.py ~/.cache/feelix/history hourly --since 2024-05-01
+    python emotion_store.py ~/.cache/feelix/history dominant --source gui
+    python emotion_store.py ~/.cache/feelix/history rolling --window 600
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, one writer is up to the user
+    fcntl = None
+
+DEFAULT_LABELS = ['anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise']
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'feelix', 'history')
+
+
+class StoreLockedError(RuntimeError):
+    """Another process already has the store open for writing"""
+
+
+class EmotionStore:
+    def __init__(self, path=DEFAULT_PATH, labels=DEFAULT_LABELS, writable=True):
+        self.path = path
+        self.writable = writable
+        self.lock = threading.Lock()
+        self.meta_path = os.path.join(path, 'meta.json')
+        self.lock_file = None
+        if writable:
+            os.makedirs(path, exist_ok=True)
+            self._acquire_writer_lock()
+        self.labels = list(labels)
+        self.sources = []  # source id -> name
+        self.source_ids = {}
+        if os.path.exists(self.meta_path):
+            self._load_meta()
+            if self.labels != list(labels):
+                raise ValueError(f"{path} holds labels {self.labels}, not {list(labels)}")
+
+        self.files = {
+            'timestamps': (os.path.join(path, 'timestamps.f8'), np.dtype('<f8'), ()),
+            'sources': (os.path.join(path, 'sources.u4'), np.dtype('<u4'), ()),
+            'probs': (os.path.join(path, 'probs.f4'), np.dtype('<f4'), (len(self.labels),)),
+        }
+        if writable:
+            # Only the writer may touch the files; readers never modify the store
+            self._write_meta()
+            self._repair()
+
+    def _acquire_writer_lock(self):
+        """Hold an exclusive lock on the store for as long as this writer is open"""
+        self.lock_file = open(os.path.join(self.path, 'writer.lock'), 'a')
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.lock_file.close()
+            self.lock_file = None
+            raise StoreLockedError(f"{self.path} is already open for writing by another process")
+
+    def close(self):
+        """Release the writer lock (readers have nothing to close)"""
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def _load_meta(self):
+        with open(self.meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        self.labels = meta['labels']
+        self.sources = meta['sources']
+        self.source_ids = {name: i for i, name in enumerate(self.sources)}
+
+    def _write_meta(self):
+        temp = self.meta_path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'labels': self.labels, 'sources': self.sources}, f)
+        os.replace(temp, self.meta_path)
+
+    def _row_size(self, name):
+        _, dtype, shape = self.files[name]
+        return dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+
+    def _complete_rows(self):
+        """Rows present in every column; a writer mid-append may be ahead in some files"""
+        counts = []
+        for name, (file_path, _, _) in self.files.items():
+            size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+            counts.append(size // self._row_size(name))
+        return min(counts)
+
+    def _repair(self):
+        """Truncate every column to the rows all of them have (after a crash mid-append)"""
+        rows = self._complete_rows()
+        for name, (file_path, _, _) in self.files.items():
+            with open(file_path, 'ab') as f:
+                f.truncate(rows * self._row_size(name))
+
+    def __len__(self):
+        return self._complete_rows()
+
+    def _check_writable(self):
+        if not self.writable:
+            raise ValueError(f"{self.path} was opened read-only")
+        if self.lock_file is None:
+            raise ValueError(f"{self.path} is closed")
+
+    def source_id(self, name):
+        self._check_writable()
+        with self.lock:
+            source_id = self.source_ids.get(name)
+            if source_id is None:
+                source_id = self.source_ids[name] = len(self.sources)
+                self.sources.append(name)
+                self._write_meta()
+            return source_id
+
+    def append(self, probs, source='default', timestamp=None):
+        """Record one result; probs is a row in label order or a {label: prob} dict"""
+        if isinstance(probs, dict):
+            probs = [probs[label] for label in self.labels]
+        self.append_many(np.asarray(probs, dtype=np.float32)[None, :], [source],
+                         None if timestamp is None else [timestamp])
+
+    def append_many(self, probs, sources, timestamps=None):
+        """Record N results at once; sources is one name or a list of N names"""
+        self._check_writable()
+        probs = np.ascontiguousarray(probs, dtype='<f4')
+        count = len(probs)
+        if probs.shape != (count, len(self.labels)):
+            raise ValueError(f"Expected probabilities of shape (N, {len(self.labels)}), got {probs.shape}")
+        if isinstance(sources, str):
+            sources = [sources] * count
+        if timestamps is None:
+            timestamps = np.full(count, time.time())
+        names, inverse = np.unique(np.asarray(sources, dtype=object), return_inverse=True)
+        source_ids = np.array([self.source_id(name) for name in names], dtype='<u4')[inverse]
+        columns = {
+            'timestamps': np.asarray(timestamps, dtype='<f8'),
+            'sources': source_ids,
+            'probs': probs,
+        }
+        with self.lock:
+            for name, (file_path, _, _) in self.files.items():
+                with open(file_path, 'ab') as f:
+                    f.write(columns[name].tobytes())
+
+    def columns(self):
+        """Read-only memory maps of (timestamps, source ids, probabilities)"""
+        if not self.writable and os.path.exists(self.meta_path):
+            self._load_meta()  # Pick up sources the writer has added since we opened
+        rows = len(self)
+        maps = []
+        for name, (file_path, dtype, shape) in self.files.items():
+            if rows == 0:
+                maps.append(np.zeros((0,) + shape, dtype=dtype))
+            else:
+                maps.append(np.memmap(file_path, dtype=dtype, mode='r', shape=(rows,) + shape))
+        return tuple(maps)
+
+    def select(self, start=None, end=None, source=None):
+        """Columns for rows with start <= timestamp < end, optionally from one source"""
+        timestamps, sources, probs = self.columns()
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        timestamps, sources, probs = timestamps[lo:hi], sources[lo:hi], probs[lo:hi]
+        if source is not None:
+            source_id = self.source_ids.get(source)
+            if source_id is None:
+                return timestamps[:0], sources[:0], probs[:0]
+            mask = sources == source_id
+            timestamps, sources, probs = timestamps[mask], sources[mask], probs[mask]
+        return timestamps, sources, probs
+
+    def bucket_mean(self, bucket_seconds=3600, **selection):
+        """Mean probabilities per time bucket; returns (bucket start times, (B, labels) means)"""
+        timestamps, _, probs = self.select(**selection)
+        if len(timestamps) == 0:
+            return np.zeros(0), np.zeros((0, len(self.labels)))
+        # Rows are in time order, so each bucket is one contiguous run
+        buckets = np.floor(timestamps / bucket_seconds).astype(np.int64)
+        run_starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        counts = np.diff(np.append(run_starts, len(buckets)))
+        sums = np.add.reduceat(probs, run_starts, axis=0, dtype=np.float64)
+        return buckets[run_starts] * float(bucket_seconds), sums / counts[:, None]
+
+    def hourly_mean(self, **selection):
+        return self.bucket_mean(3600, **selection)
+
+    def dominant_counts(self, **selection):
+        """How often each label was the top emotion, as {label: count}"""
+        _, _, probs = self.select(**selection)
+        counts = np.bincount(np.argmax(probs, axis=1), minlength=len(self.labels)) if len(probs) else \
+            np.zeros(len(self.labels), dtype=np.int64)
+        return {label: int(count) for label, count in zip(self.labels, counts)}
+
+    def rolling_mean(self, window_seconds=600, **selection):
+        """Mean probabilities over the trailing window at every row; returns (timestamps, means)"""
+        timestamps, _, probs = self.select(**selection)
+        cumulative = np.zeros((len(probs) + 1, len(self.labels)))
+        np.cumsum(probs, axis=0, out=cumulative[1:])
+        first = np.searchsorted(timestamps, timestamps - window_seconds, side='right')
+        last = np.arange(1, len(timestamps) + 1)
+        means = (cumulative[last] - cumulative[first]) / (last - first)[:, None]
+        return np.asarray(timestamps), means
+
+    def to_dataframe(self, **selection):
+        """The selected rows as a pandas DataFrame (copies them into memory)"""
+        import pandas as pd
+
+        timestamps, sources, probs = self.select(**selection)
+        frame = pd.DataFrame(np.asarray(probs), columns=self.labels)
+        frame.insert(0, 'source', pd.Categorical.from_codes(np.asarray(sources, dtype=np.int64),
+                                                            categories=self.sources))
+        frame.insert(0, 'time', pd.to_datetime(np.asarray(timestamps), unit='s'))
+        return frame
+
+
+def _parse_time(value):
+    return None if value is None else datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the emotion history store")
+    parser.add_argument("path", nargs="?", default=DEFAULT_PATH)
+    parser.add_argument("query", choices=["hourly", "dominant", "rolling", "count"])
+    parser.add_argument("--since", help="ISO date/time to start from")
+    parser.add_argument("--until", help="ISO date/time to stop before")
+    parser.add_argument("--source", help="Only rows from this source")
+    parser.add_argument("--window", type=float, default=600, help="Rolling window in seconds")
+    args = parser.parse_args()
+
+    store = EmotionStore(args.path, writable=False)
+    selection = {'start': _parse_time(args.since), 'end': _parse_time(args.until), 'source': args.source}
+    if args.query == "count":
+        print(len(store.select(**selection)[0]))
+    elif args.query == "dominant":
+        for label, count in store.dominant_counts(**selection).items():
+            print(f"{label:>10} {count}")
+    elif args.query == "hourly":
+        starts, means = store.hourly_mean(**selection)
+        print("hour             " + " ".join(f"{label:>8}" for label in store.labels))
+        for start, row in zip(starts, means):
+            hour = datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:00')
+            print(f"{hour} " + " ".join(f"{p:8.3f}" for p in row))
+    else:
+        timestamps, means = store.rolling_mean(args.window, **selection)
+        step = max(1, len(timestamps) // 50)  # Print a readable sample of the curve
+        for ts, row in zip(timestamps[::step], means[::step]):
+            when = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{when} {store.labels[int(row.argmax())]:>10} " + " ".join(f"{p:.3f}" for p in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# fake_hid.py
+
+"""
+A stand-in for the `hid` module so the light pipeline can run without
+Busylight hardware.
+
+FakeHIDBackend exposes the same enumerate()/device() calls as hidapi and
+hands out FakeHIDDevice objects that record every packet written to them
+with a timestamp. Latency (fixed plus random jitter) and failures (always,
+after N writes, or at a random rate) can be injected per device to exercise
+slow or wedged lights, and recorded packets can be decoded back into the
+colors and timings the light would show.
+
+Code that imports `hid` itself, like BusylightControlPanel.py, can be pointed
+at the simulator with install():
+
+    import fake_hid
+    fake_hid.install(fake_hid.FakeHIDBackend(4))
+    import BusylightControlPanel
+"""
+
+import random
+import sys
+import threading
+import time
+
+from busylight_commands import VENDOR_ID, PRODUCT_IDS
+from busylight_protocol import OP_KEEPALIVE, STEP_OFFSET, PacketError, decode_packet, validate_packet
+
+
+def describe_packet(packet):
+    """Decode a packet into what the light would do with it.
+
+    Returns {'kind': 'keepalive', 'timeout': seconds} or {'kind': 'program',
+    'steps': [{'target', 'rgb', 'on_time', 'off_time', 'repeat'}, ...]};
+    invalid packets come back as {'kind': 'invalid', 'error': message}.
+    """
+    try:
+        packet = validate_packet(packet)
+    except PacketError as e:
+        return {'kind': 'invalid', 'error': str(e)}
+    opcode = packet[STEP_OFFSET]
+    if opcode & 0xF0 == OP_KEEPALIVE:
+        return {'kind': 'keepalive', 'timeout': opcode & 0x0F}
+    return {
+        'kind': 'program',
+        'steps': [{
+            'target': target,
+            'rgb': (step.r, step.g, step.b),
+            'on_time': step.on_time,
+            'off_time': step.off_time,
+            'repeat': step.repeat,
+        } for target, step in decode_packet(packet)],
+    }
+
+
+class FakeHIDDevice:
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.path = None
+        self.is_open = False
+        self.latency = 0.0        # Seconds each write blocks for
+        self.jitter = 0.0         # Extra random latency, uniform in [0, jitter) seconds
+        self.fail_writes = False  # Raise from write() when set
+        self.fail_after = None    # Start failing once this many writes succeeded
+        self.fail_rate = 0.0      # Probability that any single write fails
+        self.packets = []         # (timestamp, bytes) for every successful write
+        self.failures = 0
+        self.random = random.Random(0)
+        self.lock = threading.Lock()
+
+    def open_path(self, path):
+        if self.backend is not None:
+            self.backend._attach(path, self)
+        self.path = path
+        self.is_open = True
+
+    def write(self, data):
+        if not self.is_open:
+            raise IOError("Device is not open")
+        delay = self.latency + (self.random.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        with self.lock:
+            failing = (self.fail_writes
+                       or (self.fail_after is not None and len(self.packets) >= self.fail_after)
+                       or (self.fail_rate and self.random.random() < self.fail_rate))
+            if failing:
+                self.failures += 1
+        if failing:
+            raise IOError(f"Simulated write failure on {self.path!r}")
+        packet = bytes(data)
+        with self.lock:
+            self.packets.append((time.monotonic(), packet))
+        return len(packet)
+
+    def close(self):
+        self.is_open = False
+
+    @property
+    def last_packet(self):
+        with self.lock:
+            return self.packets[-1][1] if self.packets else None
+
+    def history(self, include_keepalives=True):
+        """[(timestamp, describe_packet(...))] for every recorded write"""
+        with self.lock:
+            packets = list(self.packets)
+        history = [(timestamp, describe_packet(packet)) for timestamp, packet in packets]
+        if not include_keepalives:
+            history = [(t, d) for t, d in history if d['kind'] != 'keepalive']
+        return history
+
+    def current_program(self):
+        """Steps of the last non-keepalive packet, i.e. what the light is showing now"""
+        with self.lock:
+            packets = [packet for _, packet in reversed(self.packets)]
+        for packet in packets:
+            description = describe_packet(packet)
+            if description['kind'] == 'program':
+                return description['steps']
+        return None
+
+    def current_color(self):
+        """RGB intensities of the first step being shown, or None before any color write"""
+        steps = self.current_program()
+        return steps[0]['rgb'] if steps else None
+
+    def clear(self):
+        with self.lock:
+            self.packets = []
+            self.failures = 0
+
+
+class FakeHIDBackend:
+    """Drop-in replacement for the `hid` module with N simulated Busylights"""
+
+    def __init__(self, num_devices=1, vendor_id=VENDOR_ID, product_id=PRODUCT_IDS[0], latency=0.0,
+                 jitter=0.0):
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.latency = latency
+        self.jitter = jitter
+        self.paths = [f"fake:{i}".encode() for i in range(num_devices)]
+        self.opened = {}  # path -> most recently opened FakeHIDDevice
+        self.lock = threading.Lock()
+
+    def enumerate(self, vendor_id=0, product_id=0):
+        if vendor_id not in (0, self.vendor_id) or product_id not in (0, self.product_id):
+            return []
+        with self.lock:
+            return [{
+                'path': path,
+                'vendor_id': self.vendor_id,
+                'product_id': self.product_id,
+                'serial_number': path.decode(),
+                'product_string': 'Fake Busylight',
+            } for path in self.paths]
+
+    def device(self):
+        device = FakeHIDDevice(backend=self)
+        device.latency = self.latency
+        device.jitter = self.jitter
+        return device
+
+    def _attach(self, path, device):
+        with self.lock:
+            if path not in self.paths:
+                raise IOError(f"No such device {path!r}")
+            self.opened[path] = device
+            device.random.seed(path)
+
+    def plug(self, path):
+        """Simulate plugging a new light in"""
+        with self.lock:
+            if path not in self.paths:
+                self.paths.append(path)
+
+    def unplug(self, path):
+        """Simulate pulling a light out; its open handle starts failing"""
+        with self.lock:
+            if path in self.paths:
+                self.paths.remove(path)
+            device = self.opened.get(path)
+        if device is not None:
+            device.fail_writes = True
+
+    def devices(self):
+        """Most recently opened handle for each path, in path order"""
+        with self.lock:
+            return [self.opened[path] for path in self.paths if path in self.opened]
+
+
+def install(backend):
+    """Make `import hid` return the simulator for modules imported afterwards"""
+    sys.modules['hid'] = backend
+    return backend
@@ -0,0 +1,314 @@
+# feelix_batch.py
+
+"""
+Score large text archives with the same EmotionClassifier that drives the lights.
+
+Input is streamed (plain text, one message per line, or JSONL) from a file
+or stdin, grouped into batches and spread over a pool of worker processes,
+each with its own model and a fixed number of torch intra-op threads.
+Results are written incrementally, in input order, as JSONL or Parquet.
+
+    python feelix_batch.py chats.jsonl --text-field body -o scores.jsonl --workers 4
+    cat log.txt | python feelix_batch.py - -o scores.parquet --threads-per-worker 2
+    python feelix_batch.py chats.jsonl -o scores.jsonl --resume
+
+Every output row carries the 0-based input `offset`, so an interrupted run
+can pick up after the last row written (--resume) or at an explicit
+--start-offset. Resuming JSONL drops a last line the killed run only half
+wrote and appends. Parquet files can't be appended to, so each resumed run
+writes a scores.from-<offset>.parquet part next to the output; load the
+output and its parts together (pyarrow.dataset.dataset takes a list of
+files) to get every row. A part killed before it was closed has no footer
+and can't be read; resuming moves it aside to <part>.incomplete and redoes
+its rows.
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Per-process classifier, created by _init_worker
+_classifier = None
+
+
+def _init_worker(model_name, backend, threads):
+    global _classifier
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    from Feelix import EmotionClassifier
+    _classifier = EmotionClassifier(model_name, backend=backend, warmup=False)
+    _classifier.wait_until_ready()
+
+
+def _classify_chunk(chunk):
+    """Runs in a worker: returns the chunk back with its probability matrix and labels"""
+    return chunk, _classifier.classify_batch([text for _, _, text in chunk]), _classifier.labels
+
+
+def read_records(stream, text_field=None, id_field=None, start_offset=0):
+    """Yield (offset, id, text) from plain-text lines or JSONL records"""
+    for offset, line in enumerate(stream):
+        if offset < start_offset:
+            continue
+        line = line.rstrip('\n')
+        if text_field is None:
+            if line.strip():
+                yield offset, None, line
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            print(f"Skipping malformed JSON at offset {offset}", file=sys.stderr)
+            continue
+        text = record.get(text_field) if isinstance(record, dict) else None
+        if isinstance(text, str) and text.strip():
+            yield offset, record.get(id_field) if id_field else None, text
+
+
+def chunked(records, size):
+    iterator = iter(records)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _rows(chunk, probs, labels):
+    for (offset, record_id, _), row in zip(chunk, probs):
+        result = {'offset': offset}
+        if record_id is not None:
+            result['id'] = record_id
+        result['emotion'] = labels[int(row.argmax())]
+        result.update({label: float(p) for label, p in zip(labels, row)})
+        yield result
+
+
+class JsonlWriter:
+    def __init__(self, path, append=False):
+        self.file = sys.stdout if path == '-' else open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, rows):
+        self.file.writelines(json.dumps(row) + '\n' for row in rows)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class ParquetWriter:
+    """Appends one row group per chunk through pyarrow, all with one explicit schema.
+
+    The schema is fixed by the first chunk's labels rather than inferred from
+    its values: offset, id (as a string, null when a record has none), emotion
+    and one float64 column per label. Chunks whose ids are missing, or ints
+    in one chunk and strings in the next, still land in the same columns.
+    """
+
+    def __init__(self, path, with_id=False):
+        self.path = path
+        self.with_id = with_id
+        self.schema = None
+        self.writer = None
+
+    def _schema(self, labels):
+        import pyarrow as pa
+
+        fields = [pa.field('offset', pa.int64(), nullable=False)]
+        if self.with_id:
+            fields.append(pa.field('id', pa.string()))
+        fields.append(pa.field('emotion', pa.string()))
+        fields.extend(pa.field(label, pa.float64()) for label in labels)
+        return pa.schema(fields)
+
+    def write(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = list(rows)
+        if not rows:
+            return
+        if self.writer is None:
+            labels = [name for name in rows[0] if name not in ('offset', 'id', 'emotion')]
+            self.schema = self._schema(labels)
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+
+        columns = {name: [row.get(name) for row in rows] for name in self.schema.names}
+        if self.with_id:
+            columns['id'] = [None if value is None else str(value) for value in columns['id']]
+        self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _jsonl_resume_offset(path):
+    """Last offset in a JSONL output, dropping a line cut off mid-write so appends start clean"""
+    last, complete = None, 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # The writer was killed partway through this line
+            complete += len(line)
+            if not line.strip():
+                continue
+            try:
+                last = json.loads(line)['offset']
+            except (ValueError, KeyError, TypeError):
+                print(f"Ignoring unreadable output line in {path}", file=sys.stderr)
+    if complete < os.path.getsize(path):
+        print(f"Dropping a partially written last line from {path}", file=sys.stderr)
+        with open(path, 'r+b') as f:
+            f.truncate(complete)
+    return last
+
+
+def _parquet_parts(path):
+    """The output file and the .from-N parts written by earlier resumed runs"""
+    stem, ext = os.path.splitext(path)
+    return [path] + sorted(glob.glob(f"{glob.escape(stem)}.from-*{ext}"))
+
+
+def _parquet_resume_offset(path):
+    """Last offset over every Parquet part; parts without a footer are set aside"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    last = None
+    for part in _parquet_parts(path):
+        if not os.path.exists(part):
+            continue
+        try:
+            offsets = pq.read_table(part, columns=['offset']).column('offset').to_pylist()
+        except pa.ArrowInvalid as e:
+            # Killed before close(): the footer that indexes the row groups was never written
+            os.replace(part, part + '.incomplete')
+            print(f"Moved unreadable {part} aside ({e}); its rows will be redone", file=sys.stderr)
+            continue
+        if offsets:
+            last = max(offsets) if last is None else max(last, max(offsets))
+    return last
+
+
+def resume_offset(path):
+    """Offset to resume from: one past the last offset already in the output"""
+    if path.endswith('.parquet'):
+        last = _parquet_resume_offset(path)
+    else:
+        last = _jsonl_resume_offset(path) if os.path.exists(path) else None
+    return 0 if last is None else int(last) + 1
+
+
+def _resume_path(path, offset):
+    """Parquet files can't be appended to, so a resumed run writes a sibling part"""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.from-{offset}{ext}"
+
+
+def _worker_ready(_):
+    return _classifier is not None
+
+
+def run(records, writer, workers, batch_size, model_name, backend, threads, report_every=10.0):
+    chunks = chunked(records, batch_size)
+    count = 0
+    start = last_report = None
+
+    def emit(chunk, probs, labels):
+        nonlocal count, last_report
+        writer.write(_rows(chunk, probs, labels))
+        count += len(chunk)
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            print(f"{count} texts, {count / (now - start):.1f} texts/s", file=sys.stderr)
+            last_report = now
+
+    if workers <= 0:
+        _init_worker(model_name, backend, threads)
+        start = last_report = time.perf_counter()  # Throughput excludes model loading
+        for chunk in chunks:
+            emit(*_classify_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_name, backend, threads)) as pool:
+            # Start the workers and let them load their models before the clock starts
+            list(pool.map(_worker_ready, range(workers)))
+            start = last_report = time.perf_counter()
+            # Keep a bounded number of chunks in flight and emit them in input order
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_classify_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    emit(*pending.popleft().result())
+            while pending:
+                emit(*pending.popleft().result())
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {count} texts in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f} texts/s)",
+          file=sys.stderr)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch emotion scoring for text archives")
+    parser.add_argument("input", help="Input file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Output .jsonl/.parquet file, or - for stdout")
+    parser.add_argument("--format", choices=["jsonl", "parquet"],
+                        help="Output format (default: from the output extension)")
+    parser.add_argument("--text-field", help="Read JSONL and take text from this field "
+                                             "(default for .jsonl input: text)")
+    parser.add_argument("--id-field", help="JSONL field copied to the output as 'id' "
+                                           "(as a string in Parquet output)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() // 2 or 1,
+                        help="Worker processes; 0 runs in this process")
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                        help="torch intra-op threads in each worker")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--start-offset", type=int, default=0, help="Skip input records before this offset")
+    parser.add_argument("--resume", action="store_true", help="Continue after the last offset in --output")
+    parser.add_argument("--model", default="j-hartmann/emotion-english-distilroberta-base")
+    parser.add_argument("--backend", default="torch", choices=["torch", "int8", "onnx"])
+    args = parser.parse_args()
+
+    fmt = args.format or ('parquet' if args.output.endswith('.parquet') else 'jsonl')
+    if fmt == 'parquet' and args.output == '-':
+        parser.error("Parquet output needs a file path")
+    text_field = args.text_field
+    if text_field is None and args.input.endswith('.jsonl'):
+        text_field = 'text'
+
+    start_offset = args.start_offset
+    output = args.output
+    if args.resume and output != '-':
+        start_offset = max(start_offset, resume_offset(output))
+        print(f"Resuming at offset {start_offset}", file=sys.stderr)
+        if fmt == 'parquet' and start_offset > 0:
+            output = _resume_path(output, start_offset)
+
+    if fmt == 'parquet':
+        writer = ParquetWriter(output, with_id=args.id_field is not None)
+    else:
+        writer = JsonlWriter(output, append=args.resume)
+
+    stream = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    try:
+        records = read_records(stream, text_field, args.id_field, start_offset)
+        run(records, writer, args.workers, args.batch_size, args.model, args.backend,
+            args.threads_per_worker)
+    finally:
+        writer.close()
+        if stream is not sys.stdin:
+            stream.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# feelix_bench.py
+
+"""
+End-to-end benchmarks on simulated lights (see fake_hid.py), so
+regressions can be measured without Busylight hardware.
+
+    text_to_packet   text in -> classification -> packet written (p50/p99 ms)
+    throughput       classify_batch texts/s at several batch sizes
+    fanout           one command to 1, 10 and 100 simulated lights (p50/p99 ms)
+
+Results are printed as JSON (or written with --output) together with the
+environment they were taken in, so runs can be tracked over time:
+
+    python feelix_bench.py --output bench-$(git rev-parse --short HEAD).json
+    python feelix_bench.py --skip-model --device-latency-ms 2
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from busylight_commands import COMMANDS
+from fake_hid import FakeHIDBackend
+from hid_writer import HIDWriteScheduler
+from inference_backends import SAMPLE_TEXTS
+
+
+def _summary(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'runs': int(samples.size),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'mean_ms': float(samples.mean()),
+        'max_ms': float(samples.max()),
+    }
+
+
+def bench_text_to_packet(model_name, backend, texts=SAMPLE_TEXTS, runs=3):
+    """Latency from process_text() being called to the packet landing on a simulated light"""
+    from Feelix import EmotionalBusylight
+    from emotion_state import EmotionStateTracker
+
+    fake = FakeHIDBackend(1)
+    light = EmotionalBusylight(hid_backend=fake, speak=False, model_name=model_name, backend=backend)
+    try:
+        light.emotion_classifier.wait_until_ready()
+        light.emotion_classifier.cache = None  # Measure the model, not cache hits
+        # Every text must produce a write: no smoothing, no hysteresis
+        light.emotion_state = EmotionStateTracker(light.emotion_classifier.labels, alpha=1.0,
+                                                  switch_margin=0.0)
+        light.writer.flush(timeout=1.0)
+        device = fake.devices()[0]
+
+        latencies, mismatches = [], 0
+        for _ in range(runs):
+            for text in texts:
+                light.last_command = None
+                start = time.monotonic()
+                emotion, _ = light.process_text(text)
+                light.writer.flush(timeout=5.0)
+                written_at = device.packets[-1][0]
+                latencies.append((written_at - start) * 1000)
+                if device.last_packet != light.mapping.packet(emotion):
+                    mismatches += 1
+        result = _summary(latencies)
+        result['packet_mismatches'] = mismatches
+        return result
+    finally:
+        light.disconnect()
+
+
+def bench_throughput(model_name, backend, batch_sizes=(1, 8, 32, 64), texts=SAMPLE_TEXTS, total=256):
+    """classify_batch() texts/s at each batch size"""
+    from Feelix import EmotionClassifier
+
+    classifier = EmotionClassifier(model_name, backend=backend)
+    classifier.wait_until_ready()
+    # Distinct texts, so classify_batch's de-duplication doesn't shrink the workload
+    workload = [f"{texts[i % len(texts)]} ({i})" for i in range(total)]
+    results = {}
+    for batch_size in batch_sizes:
+        classifier.classify_batch(workload[:batch_size], batch_size=batch_size)  # warm up
+        start = time.perf_counter()
+        classifier.classify_batch(workload, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        results[str(batch_size)] = {'texts_per_s': total / elapsed, 'elapsed_s': elapsed}
+    return results
+
+
+def bench_fanout(device_counts=(1, 10, 100), runs=50, latency_ms=0.0):
+    """Time from submitting one command to it being written to every simulated light"""
+    colors = [COMMANDS[name] for name in ('red', 'green', 'blue')]
+    results = {}
+    for count in device_counts:
+        fake = FakeHIDBackend(count, latency=latency_ms / 1000)
+        writer = HIDWriteScheduler()
+        for info in fake.enumerate():
+            device = fake.device()
+            device.open_path(info['path'])
+            writer.add_device(device, info['path'])
+        devices = fake.devices()
+
+        samples = []
+        for run in range(runs):
+            start = time.monotonic()
+            writer.submit(colors[run % len(colors)])
+            writer.flush(timeout=5.0)
+            samples.append((max(device.packets[-1][0] for device in devices) - start) * 1000)
+        writer.stop()
+
+        results[str(count)] = _summary(samples)
+        results[str(count)]['lost'] = sum(runs - len(device.packets) for device in devices)
+    return results
+
+
+def environment():
+    info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+    try:
+        import torch
+        info['torch'] = torch.__version__
+        info['torch_threads'] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+def run_benchmarks(args):
+    results = {
+        'environment': environment(),
+        'config': {'model': args.model, 'backend': args.backend,
+                   'device_latency_ms': args.device_latency_ms},
+    }
+    if not args.skip_model:
+        results['text_to_packet'] = bench_text_to_packet(args.model, args.backend, runs=args.runs)
+        print(f"text->packet p50 {results['text_to_packet']['p50_ms']:.1f}ms "
+              f"p99 {results['text_to_packet']['p99_ms']:.1f}ms", file=sys.stderr)
+        results['throughput'] = bench_throughput(args.model, args.backend, args.batch_sizes)
+        for batch_size, r in results['throughput'].items():
+            print(f"batch {batch_size}: {r['texts_per_s']:.1f} texts/s", file=sys.stderr)
+    results['fanout'] = bench_fanout(args.devices, args.fanout_runs, args.device_latency_ms)
+    for count, r in results['fanout'].items():
+        print(f"fan-out to {count}: p50 {r['p50_ms']:.2f}ms p99 {r['p99_ms']:.2f}ms", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hardware-free Feelix benchmarks")
+    parser.add_argument("--model", default="j-hartmann/emotion-english-distilroberta-base")
+    parser.add_argument("--backend", default="torch", choices=["torch", "int8", "onnx"])
+    parser.add_argument("--runs", type=int, default=3, help="Passes over the sample texts")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 100],
+                        help="Simulated light counts for the fan-out benchmark")
+    parser.add_argument("--fanout-runs", type=int, default=50)
+    parser.add_argument("--device-latency-ms", type=float, default=0.0,
+                        help="Simulated per-write USB latency")
+    parser.add_argument("--skip-model", action="store_true", help="Only run the fan-out benchmark")
+    parser.add_argument("-o", "--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    # Progress and the light's own log lines go to stderr so stdout stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmarks(args)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# feelix_server.py
+
+"""
+Headless Feelix server: drive the lights from chat bots and ticket systems.
+
+Endpoints:
+    POST /classify   {"text": "..."}                  -> emotion and probabilities
+    POST /express    {"text": "...", "speak": false, "source": "#team"}
+                                                      -> classify, then set the lights
+    GET  /ws         WebSocket; each message is text or {"text", "express", "source"} JSON
+    GET  /metrics    stage timings and counters in the Prometheus text format
+    POST /profile    {"seconds": 30} samples stacks to a collapsed-stack file
+    GET  /stats      batcher, cache, device, emotion state and rate limiter counters
+
+Requests from all clients are funnelled through one MicroBatcher, so
+concurrent requests share padded forward passes. A cap on in-flight
+classifications gives backpressure (503 once it is reached), and every
+client gets a token bucket (429 when it is empty) in place of the GUI's
+fixed three-second gate. With --routes, /express shows a result only on
+the device groups its "source" routes to (see device_groups.py).
+
+    python feelix_server.py --port 8080
+    python feelix_server.py --fake-hid 4   # no hardware needed
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web, WSMsgType
+
+from Feelix import EmotionalBusylight
+from micro_batcher import MicroBatcher
+from metrics import METRICS, PROFILER
+from emotion_store import EmotionStore, StoreLockedError
+
+
+def _path_name(path):
+    return path.decode(errors='replace') if isinstance(path, bytes) else str(path)
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RateLimiter:
+    """One TokenBucket per client id, forgetting clients idle for `idle_ttl` seconds"""
+
+    def __init__(self, rate=5.0, burst=10, idle_ttl=300):
+        self.rate = rate
+        self.burst = burst
+        self.idle_ttl = idle_ttl
+        self.buckets = {}
+        self.rejected = 0
+
+    def allow(self, client_id):
+        bucket = self.buckets.get(client_id)
+        if bucket is None:
+            if len(self.buckets) > 10000:
+                self._prune()
+            bucket = self.buckets[client_id] = TokenBucket(self.rate, self.burst)
+        if bucket.allow():
+            return True
+        self.rejected += 1
+        return False
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        self.buckets = {k: b for k, b in self.buckets.items() if b.updated >= cutoff}
+
+
+class Overloaded(Exception):
+    """Too many classifications in flight"""
+
+
+class FeelixServer:
+    def __init__(self, light, max_in_flight=256, rate=5.0, burst=10, batch_wait_ms=5, router=None,
+                 store=None):
+        self.light = light
+        self.router = router  # Optional device_groups.SourceRouter; None lights every device
+        self.store = store  # Optional emotion_store.EmotionStore recording every result
+        self.classifier = light.emotion_classifier
+        self.batcher = MicroBatcher(self.classifier, max_wait_ms=batch_wait_ms)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.rate_limiter = RateLimiter(rate=rate, burst=burst)
+        self.requests = 0
+        self.overloaded = 0
+
+    def client_id(self, request):
+        return request.headers.get('X-Client-Id') or request.remote or 'unknown'
+
+    async def classify(self, text, source=''):
+        """Classify through the shared micro-batcher without blocking the event loop"""
+        if self.in_flight >= self.max_in_flight:
+            self.overloaded += 1
+            raise Overloaded()
+        self.in_flight += 1
+        try:
+            probs = await asyncio.wrap_future(self.batcher.submit(text))
+        finally:
+            self.in_flight -= 1
+        if self.store is not None:
+            self.store.append(probs, source=source or 'server')
+        return self.classifier.to_result(probs)
+
+    async def express(self, text, speak=False, source=''):
+        emotion, probs = await self.classify(text, source)
+        if self.router is None:
+            self.light.set_emotion_color(emotion, probs)
+        else:
+            for group in self.router.route(source):
+                self.light.set_emotion_color(emotion, probs, group=group)
+        if speak and self.light.tts is not None:
+            self.light.tts.speak(text)
+        return emotion, probs
+
+    async def _handle(self, request, express):
+        self.requests += 1
+        if not self.rate_limiter.allow(self.client_id(request)):
+            return web.json_response({'error': 'rate limit exceeded'}, status=429,
+                                     headers={'Retry-After': '1'})
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.json_response({'error': 'body must be JSON'}, status=400)
+        text = body.get('text') if isinstance(body, dict) else None
+        if not isinstance(text, str) or not text.strip():
+            return web.json_response({'error': "'text' must be a non-empty string"}, status=400)
+        speak = body.get('speak', False)
+        if not isinstance(speak, bool):
+            return web.json_response({'error': "'speak' must be true or false"}, status=400)
+
+        try:
+            if express:
+                emotion, probs = await self.express(text, speak=speak,
+                                                    source=str(body.get('source', '')))
+            else:
+                emotion, probs = await self.classify(text, str(body.get('source', '')))
+        except Overloaded:
+            return web.json_response({'error': 'server busy'}, status=503,
+                                     headers={'Retry-After': '1'})
+        return web.json_response({'emotion': emotion, 'probabilities': probs})
+
+    async def handle_classify(self, request):
+        return await self._handle(request, express=False)
+
+    async def handle_express(self, request):
+        return await self._handle(request, express=True)
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        client_id = self.client_id(request)
+
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            self.requests += 1
+            text, express, source = message.data, False, ''
+            try:
+                payload = json.loads(message.data)
+                if isinstance(payload, dict):
+                    text, express = payload.get('text'), payload.get('express', False)
+                    source = str(payload.get('source', ''))
+            except json.JSONDecodeError:
+                pass
+
+            if not isinstance(text, str) or not text.strip():
+                await ws.send_json({'error': "'text' must be a non-empty string"})
+            elif not isinstance(express, bool):
+                await ws.send_json({'error': "'express' must be true or false"})
+            elif not self.rate_limiter.allow(client_id):
+                await ws.send_json({'error': 'rate limit exceeded'})
+            else:
+                try:
+                    if express:
+                        emotion, probs = await self.express(text, source=source)
+                    else:
+                        emotion, probs = await self.classify(text, source)
+                    await ws.send_json({'emotion': emotion, 'probabilities': probs})
+                except Overloaded:
+                    await ws.send_json({'error': 'server busy'})
+        return ws
+
+    async def handle_stats(self, request):
+        stats = {
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'overloaded': self.overloaded,
+            'rate_limited': self.rate_limiter.rejected,
+            'batches': self.batcher.batches_run,
+            'texts_classified': self.batcher.texts_classified,
+            'model_ready': self.classifier.is_ready,
+            'devices': {_path_name(name): s for name, s in self.light.writer.stats().items()},
+            'emotion_state': self.light.emotion_state.stats(),
+            'registry': self.light.registry.stats(),
+            'keepalive': self.light.keepalive.stats(),
+        }
+        if self.classifier.cache is not None:
+            stats['cache'] = self.classifier.cache.stats()
+        return web.json_response(stats)
+
+    async def handle_metrics(self, request):
+        return web.Response(text=METRICS.render_prometheus(), content_type='text/plain')
+
+    async def handle_profile(self, request):
+        """Start the stack sampler for a while, or stop it with {"seconds": 0}"""
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            body = {}
+        seconds = body.get('seconds', 30) if isinstance(body, dict) else 30
+        if not isinstance(seconds, (int, float)) or seconds < 0:
+            return web.json_response({'error': "'seconds' must be a non-negative number"}, status=400)
+        if seconds == 0:
+            return web.json_response({'profiling': False, 'path': PROFILER.stop()})
+        PROFILER.start(duration=seconds)
+        return web.json_response({'profiling': True, 'seconds': seconds, 'path': PROFILER.path})
+
+    def make_app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post('/classify', self.handle_classify),
+            web.post('/express', self.handle_express),
+            web.get('/ws', self.handle_ws),
+            web.get('/metrics', self.handle_metrics),
+            web.post('/profile', self.handle_profile),
+            web.get('/stats', self.handle_stats),
+        ])
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def _on_shutdown(self, app):
+        self.batcher.stop()
+        self.light.turn_off()
+        self.light.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Feelix HTTP/WebSocket server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--model", default="j-hartmann/emotion-english-distilroberta-base")
+    parser.add_argument("--backend", default="torch", choices=["torch", "int8", "onnx"])
+    parser.add_argument("--cache-path", help="sqlite file for the persistent classification cache")
+    parser.add_argument("--fake-hid", type=int, metavar="N",
+                        help="Use N simulated lights instead of real hardware")
+    parser.add_argument("--speak", action="store_true", help="Allow /express to speak the text")
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests per second per client")
+    parser.add_argument("--burst", type=int, default=10, help="Burst size per client")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--batch-wait-ms", type=float, default=5)
+    parser.add_argument("--routes", help="Routing JSON mapping sources to device groups")
+    parser.add_argument("--mapping", help="JSON/TOML emotion-to-light mapping, reloaded when it changes")
+    parser.add_argument("--store", help="Directory of an emotion_store.EmotionStore to record results in")
+    args = parser.parse_args()
+
+    options = {}
+    if args.mapping:
+        options['mapping'] = args.mapping
+    router = None
+    if args.routes:
+        from device_groups import load_routing
+        options['groups'], router = load_routing(args.routes)
+    if args.fake_hid is not None:
+        from fake_hid import FakeHIDBackend
+        options['hid_backend'] = FakeHIDBackend(args.fake_hid)
+
+    store = None
+    if args.store:
+        try:
+            store = EmotionStore(args.store)
+        except StoreLockedError as e:
+            parser.error(str(e))
+
+    light = EmotionalBusylight(cache_path=args.cache_path, speak=args.speak,
+                               model_name=args.model, backend=args.backend, **options)
+    server = FeelixServer(light, max_in_flight=args.max_in_flight, rate=args.rate,
+                          burst=args.burst, batch_wait_ms=args.batch_wait_ms, router=router,
+                          store=store)
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
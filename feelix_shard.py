@@ -0,0 +1,235 @@
+# feelix_shard.py
+
+"""
+Multi-process deployment: one inference hub, many light workers.
+
+The hub owns the model. Producers send it (source, text) messages; it
+classifies them through a MicroBatcher, routes each result to device groups
+with a SourceRouter, and forwards (group, emotion, probs) to whichever worker
+owns the group. Workers own the USB side: each runs a light-only
+EmotionalBusylight for the groups it was started with and applies results
+with per-group smoothing. Inference and USB fan-out therefore scale
+independently, and a wedged light only stalls its own worker.
+
+The hub shares its listener plumbing with inference_daemon.InferenceDaemon
+(see ModelServer there), including its security: the socket sits in the
+per-user runtime directory and connections authenticate with the key in
+<socket>.key. Everything talks over that Unix socket
+(multiprocessing.connection) with pickled dict messages:
+
+    worker -> hub   {'type': 'worker', 'groups': [...]}
+    producer -> hub {'type': 'text', 'source': ..., 'text': ...}
+    hub -> producer {'emotion', 'probabilities', 'groups'} or {'error'}
+    hub -> worker   {'type': 'emotion', 'group', 'emotion', 'probabilities'}
+
+    python feelix_shard.py hub --routes routes.json
+    python feelix_shard.py worker --routes routes.json --groups platform support
+    python feelix_shard.py send --source '#platform' "We shipped it!"
+"""
+
+import argparse
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+from device_groups import load_routing
+from inference_daemon import ModelServer, check_owner, client_authkey, default_address
+
+SOCKET_NAME = 'hub.sock'
+
+
+def _hub_connection(address, authkey):
+    """Authenticated connection to a hub socket owned by this user"""
+    check_owner(address)
+    if authkey is None:
+        authkey = client_authkey(address)
+    return Client(address, family='AF_UNIX', authkey=authkey)
+
+
+class InferenceHub(ModelServer):
+    name = 'Inference hub'
+    socket_name = SOCKET_NAME
+
+    def __init__(self, classifier, router, address=None, authkey=None, batch_wait_ms=5):
+        super().__init__(classifier, address, authkey, batch_wait_ms)
+        self.router = router
+        self.workers = {}  # group -> (connection, send lock)
+
+        # Statistics
+        self.messages = 0
+        self.forwarded = 0
+        self.unrouted = 0
+
+    def _serve_connection(self, connection):
+        send_lock = threading.Lock()
+        owned = []
+        try:
+            while True:
+                message = connection.recv()
+                kind = message.get('type') if isinstance(message, dict) else None
+                if kind == 'worker':
+                    owned = list(message.get('groups', []))
+                    with self.lock:
+                        for group in owned:
+                            self.workers[group] = (connection, send_lock)
+                    print(f"Worker registered for groups {owned}")
+                elif kind == 'text':
+                    reply = self.handle_text(message.get('source', ''), message.get('text'))
+                    with send_lock:
+                        connection.send(reply)
+                else:
+                    with send_lock:
+                        connection.send({'error': f"unknown message type {kind!r}"})
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self.lock:
+                for group in owned:
+                    if self.workers.get(group, (None,))[0] is connection:
+                        del self.workers[group]
+            if owned:
+                print(f"Worker for groups {owned} disconnected")
+            connection.close()
+
+    def handle_text(self, source, text):
+        """Classify one message and forward it to the workers owning its groups"""
+        if not isinstance(text, str) or not text.strip():
+            return {'error': "'text' must be a non-empty string"}
+        self.messages += 1
+        emotion, probs = self.classifier.to_result(self.batcher.submit(text).result())
+
+        groups = self.router.route(source)
+        if not groups:
+            self.unrouted += 1
+        for group in groups:
+            with self.lock:
+                worker = self.workers.get(group)
+            if worker is None:
+                print(f"No worker owns group '{group}'")
+                continue
+            connection, send_lock = worker
+            try:
+                with send_lock:
+                    connection.send({'type': 'emotion', 'group': group,
+                                     'emotion': emotion, 'probabilities': probs})
+                self.forwarded += 1
+            except OSError as e:
+                print(f"Failed to forward to group '{group}': {e}")
+        return {'emotion': emotion, 'probabilities': probs, 'groups': groups}
+
+
+class LightWorker:
+    """Applies emotions from the hub to the groups this process owns, reconnecting as needed"""
+
+    def __init__(self, light, groups, address=None, authkey=None, max_backoff=10.0):
+        self.light = light
+        self.groups = list(groups)
+        self.address = address or default_address(SOCKET_NAME)
+        self.authkey = authkey
+        self.max_backoff = max_backoff
+        self.running = True
+        self.applied = 0
+
+    def run(self):
+        backoff = 0.5
+        while self.running:
+            try:
+                connection = _hub_connection(self.address, self.authkey)
+            except (OSError, AuthenticationError) as e:
+                print(f"Hub unavailable ({e}), retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
+                continue
+            backoff = 0.5
+            try:
+                connection.send({'type': 'worker', 'groups': self.groups})
+                while self.running:
+                    message = connection.recv()
+                    if message.get('type') == 'emotion' and message.get('group') in self.groups:
+                        self.light.set_emotion_color(message['emotion'], message['probabilities'],
+                                                     group=message['group'])
+                        self.applied += 1
+            except (EOFError, OSError):
+                print("Lost connection to the hub")
+            finally:
+                connection.close()
+
+
+class HubClient:
+    """Producer side: send texts to the hub and get the classification back"""
+
+    def __init__(self, address=None, authkey=None):
+        self.connection = _hub_connection(address or default_address(SOCKET_NAME), authkey)
+        self.lock = threading.Lock()
+
+    def send(self, source, text):
+        with self.lock:
+            self.connection.send({'type': 'text', 'source': source, 'text': text})
+            reply = self.connection.recv()
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+        return reply
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded Feelix: one inference hub, many light workers")
+    parser.add_argument("--socket", help="Unix socket path of the hub (default: in the per-user runtime directory)")
+    parser.add_argument("--authkey", help="Shared secret for the socket (default: generated into <socket>.key)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    hub = commands.add_parser("hub", help="Run the model and route results")
+    hub.add_argument("--routes", required=True, help="Routing JSON (see device_groups.py)")
+    hub.add_argument("--model", default="j-hartmann/emotion-english-distilroberta-base")
+    hub.add_argument("--backend", default="torch", choices=["torch", "int8", "onnx"])
+    hub.add_argument("--cache-path", help="sqlite file for the persistent classification cache")
+
+    worker = commands.add_parser("worker", help="Drive the lights of some groups")
+    worker.add_argument("--routes", required=True, help="Routing JSON (see device_groups.py)")
+    worker.add_argument("--groups", nargs="+", required=True)
+    worker.add_argument("--fake-hid", type=int, metavar="N", help="Use N simulated lights")
+    worker.add_argument("--mapping", help="JSON/TOML emotion-to-light mapping, reloaded when it changes")
+
+    send = commands.add_parser("send", help="Send one message to the hub")
+    send.add_argument("--source", default="")
+    send.add_argument("text")
+    args = parser.parse_args()
+
+    authkey = args.authkey.encode() if args.authkey else None
+    if args.command == "hub":
+        from Feelix import EmotionClassifier
+        from classification_cache import ClassificationCache
+        _, router = load_routing(args.routes)
+        classifier = EmotionClassifier(args.model, cache=ClassificationCache(disk_path=args.cache_path),
+                                       backend=args.backend, load_in_background=True)
+        InferenceHub(classifier, router, args.socket, authkey).serve_forever()
+    elif args.command == "worker":
+        from Feelix import EmotionalBusylight
+        groups, _ = load_routing(args.routes)
+        unknown = [name for name in args.groups if name not in groups]
+        if unknown:
+            parser.error(f"Unknown group(s) {unknown}")
+        options = {}
+        if args.fake_hid is not None:
+            from fake_hid import FakeHIDBackend
+            options['hid_backend'] = FakeHIDBackend(args.fake_hid)
+        if args.mapping:
+            options['mapping'] = args.mapping
+        light = EmotionalBusylight(speak=False, groups=groups, load_model=False, **options)
+        try:
+            LightWorker(light, args.groups, args.socket, authkey).run()
+        finally:
+            light.turn_off()
+            light.disconnect()
+    else:
+        client = HubClient(args.socket, authkey)
+        reply = client.send(args.source, args.text)
+        client.close()
+        print(f"{reply['emotion']} -> groups {reply['groups']}")
+
+
+if __name__ == "__main__":
+    main()
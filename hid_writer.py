@@ -0,0 +1,275 @@
+# hid_writer.py
+
+"""
+Non-blocking HID write scheduler.
+
+Each device gets its own writer thread and a small bounded queue, so a slow
+or wedged light only delays itself. Commands are queued under a coalescing
+key: a newer command with the same key replaces the pending one, which means
+a backed-up light jumps straight to the latest color instead of replaying
+every intermediate state.
+"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from busylight_protocol import validate_packet
+from metrics import METRICS
+
+
+class DeviceWriter:
+    def __init__(self, device, name, max_queue=8, on_error=None, on_first_write=None):
+        self.device = device
+        self.name = name
+        self.max_queue = max_queue
+        self.on_error = on_error  # Called as on_error(writer, exception)
+        self.on_first_write = on_first_write  # Called as on_first_write(writer) once the device takes a write
+        self.pending = OrderedDict()  # coalescing key -> command
+        self.condition = threading.Condition()
+        self.running = True
+        self.busy = False
+
+        # Per-device statistics
+        self.writes = 0
+        self.errors = 0
+        self.drops = 0
+        self.coalesced = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+        self.last_write_time = None
+
+        self.thread = threading.Thread(target=self._write_loop, daemon=True,
+                                       name=f"hid-writer-{name}")
+        self.thread.start()
+
+    def submit(self, command, key='state'):
+        """Queue a command; returns immediately"""
+        with self.condition:
+            if not self.running:
+                return
+            if key in self.pending:
+                self.pending[key] = command
+                self.coalesced += 1
+            else:
+                if len(self.pending) >= self.max_queue:
+                    self.pending.popitem(last=False)
+                    self.drops += 1
+                self.pending[key] = command
+            self.condition.notify()
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been written; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.pending or self.busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=1.0):
+        with self.condition:
+            self.running = False
+            self.pending.clear()
+            self.condition.notify_all()
+        # An on_error handler may remove the device from its own writer thread
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout=timeout)
+
+    def _write_loop(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                _, command = self.pending.popitem(last=False)
+                self.busy = True
+
+            start = time.perf_counter()
+            try:
+                self.device.write(command)
+            except Exception as e:
+                with self.condition:
+                    self.errors += 1
+                METRICS.inc('hid_write_errors')
+                print(f"Error writing to device {self.name}: {e}")
+                if self.on_error is not None:
+                    self.on_error(self, e)
+            else:
+                latency = time.perf_counter() - start
+                METRICS.observe('hid_write', latency)
+                with self.condition:
+                    self.writes += 1
+                    first = self.writes == 1
+                    self.total_latency += latency
+                    self.last_latency = latency
+                    self.max_latency = max(self.max_latency, latency)
+                    self.last_write_time = time.monotonic()
+                if first and self.on_first_write is not None:
+                    self.on_first_write(self)
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'writes': self.writes,
+                'errors': self.errors,
+                'drops': self.drops,
+                'coalesced': self.coalesced,
+                'queued': len(self.pending),
+                'avg_latency_ms': self.total_latency / self.writes * 1000 if self.writes else 0.0,
+                'max_latency_ms': self.max_latency * 1000,
+                'last_latency_ms': self.last_latency * 1000,
+            }
+
+
+class HIDWriteScheduler:
+    """Fans commands out to every registered device through its own DeviceWriter"""
+
+    def __init__(self, max_queue=8, on_error=None, validate=True, on_first_write=None):
+        self.max_queue = max_queue
+        self.on_error = on_error
+        self.on_first_write = on_first_write
+        self.validate = validate  # Reject malformed packets before they reach any device
+        self.writers = OrderedDict()  # name -> DeviceWriter
+        self.lock = threading.Lock()
+        self._unique = itertools.count()
+
+    def add_device(self, device, name):
+        with self.lock:
+            if name in self.writers:
+                return self.writers[name]
+            writer = DeviceWriter(device, name, max_queue=self.max_queue, on_error=self.on_error,
+                                  on_first_write=self.on_first_write)
+            self.writers[name] = writer
+            return writer
+
+    def remove_device(self, name):
+        with self.lock:
+            writer = self.writers.pop(name, None)
+        if writer is not None:
+            writer.stop()
+        return writer
+
+    def __len__(self):
+        return len(self.writers)
+
+    def submit(self, command, key='state', names=None):
+        """Queue a command for all devices (or just `names`).
+
+        key=None disables coalescing for this command. Raises
+        busylight_protocol.PacketError for malformed packets when validating.
+        """
+        if self.validate:
+            command = validate_packet(command)
+        if key is None:
+            key = ('unique', next(self._unique))
+        with self.lock:
+            writers = [w for n, w in self.writers.items() if names is None or n in names]
+        for writer in writers:
+            writer.submit(command, key)
+        return len(writers)
+
+    def flush(self, timeout=None):
+        with self.lock:
+            writers = list(self.writers.values())
+        return all(writer.flush(timeout) for writer in writers)
+
+    def stats(self):
+        with self.lock:
+            return {name: writer.stats() for name, writer in self.writers.items()}
+
+    def stop(self):
+        with self.lock:
+            writers = list(self.writers.values())
+            self.writers.clear()
+        for writer in writers:
+            writer.stop()
+
+
+class KeepaliveScheduler:
+    """One timer thread that keeps every device behind a HIDWriteScheduler alive.
+
+    Each device is due `interval` seconds after its last write. A device that
+    got a real write in the meantime is skipped and rescheduled from that
+    write, so busy lights see no extra traffic. Keepalives go through the
+    device's own writer under the 'keepalive' key, so they never pile up.
+    """
+
+    def __init__(self, scheduler, packet, interval=10.0):
+        self.scheduler = scheduler
+        self.packet = validate_packet(packet)
+        self.interval = interval
+        self.next_due = {}  # device name -> monotonic time its keepalive is due
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # Statistics
+        self.sent = 0
+        self.skipped = 0
+
+    def start(self):
+        with self.condition:
+            if self.thread is not None:
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._keepalive_loop, daemon=True, name="hid-keepalive")
+            self.thread.start()
+
+    def stop(self, timeout=1.0):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            thread.join(timeout=timeout)
+
+    def tick(self, now=None):
+        """Send keepalives to every device that is due; returns seconds until the next one"""
+        now = time.monotonic() if now is None else now
+        with self.scheduler.lock:
+            writers = dict(self.scheduler.writers)
+
+        # Devices added since the last tick are due straight away; removed ones are forgotten
+        self.next_due = {name: self.next_due.get(name, now) for name in writers}
+        for name, writer in writers.items():
+            if self.next_due[name] > now:
+                continue
+            with writer.condition:
+                last_write = writer.last_write_time
+            # The slack keeps our own previous keepalive from counting as a real write
+            if last_write is not None and now - last_write < self.interval * 0.9:
+                self.skipped += 1
+                self.next_due[name] = last_write + self.interval
+            else:
+                writer.submit(self.packet, 'keepalive')
+                self.sent += 1
+                self.next_due[name] = now + self.interval
+        return min(self.next_due.values(), default=now + self.interval) - now
+
+    def _keepalive_loop(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+            wait = self.tick()
+            with self.condition:
+                if self.running:
+                    self.condition.wait(max(wait, 0.05))
+
+    def stats(self):
+        return {
+            'devices': len(self.next_due),
+            'sent': self.sent,
+            'skipped': self.skipped,
+            'interval': self.interval,
+        }
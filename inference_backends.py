@@ -0,0 +1,231 @@
+# inference_backends.py
+
+"""
+Pluggable inference backends for EmotionClassifier.
+
+Every backend takes padded NumPy input_ids / attention_mask arrays and
+returns NumPy logits, so the classifier doesn't care what runs the model:
+
+    torch  - the stock fp32 PyTorch model (GPU when available)
+    int8   - PyTorch dynamic int8 quantization of the Linear layers (CPU)
+    onnx   - the model exported to ONNX and run through onnxruntime (CPU)
+
+torch is imported inside the backends so importing this module stays cheap.
+
+Run this module directly to check each backend against fp32 on a fixed
+sample set and report latency and throughput:
+
+    python inference_backends.py --backends torch int8 onnx
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+
+DEFAULT_ONNX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "feelix", "onnx")
+
+# Fixed sample set for parity checks and benchmarks
+SAMPLE_TEXTS = [
+    "ok",
+    "thanks!",
+    "I can't believe you did this to me again.",
+    "This is the best news I've heard all year!",
+    "I'm really worried about tomorrow's surgery.",
+    "Ugh, the fridge smells like something died in it.",
+    "The meeting has been moved to 3pm.",
+    "I miss her so much it hurts.",
+    "Wait, you're telling me we won the whole thing?",
+    "Please stop sending me these emails, it's driving me crazy.",
+    "We shipped the release on time and the customers love it.",
+    "Nobody showed up to my birthday party.",
+    "Can you forward me the invoice from last week?",
+    "That noise in the basement at night scares me.",
+    "Wow, I did not expect the package to arrive today.",
+    "The food was disgusting and the staff didn't care.",
+]
+
+
+class TorchBackend:
+    """Stock fp32 PyTorch inference"""
+    name = 'torch'
+
+    def __init__(self, model, device=None):
+        import torch
+        self.torch = torch
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = model.to(self.device).eval()
+
+    def __call__(self, input_ids, attention_mask):
+        torch = self.torch
+        input_ids = torch.from_numpy(np.asarray(input_ids, dtype=np.int64)).to(self.device)
+        attention_mask = torch.from_numpy(np.asarray(attention_mask, dtype=np.int64)).to(self.device)
+        with torch.no_grad():
+            logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+        return logits.float().cpu().numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch dynamic int8 quantization; CPU only"""
+    name = 'int8'
+
+    def __init__(self, model, device=None):
+        import torch
+        model = model.to("cpu").eval()
+        quantized = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8)
+        super().__init__(quantized, device="cpu")
+
+
+class OnnxBackend:
+    """Model exported to ONNX and executed with onnxruntime on CPU"""
+    name = 'onnx'
+
+    def __init__(self, model, device=None, model_name="model", onnx_dir=DEFAULT_ONNX_DIR,
+                 num_threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The onnx backend needs onnxruntime: pip install onnxruntime")
+
+        safe_name = model_name.strip("/").replace("/", "__")
+        self.path = os.path.join(onnx_dir, f"{safe_name}.onnx")
+        if not os.path.exists(self.path):
+            self.export(model, self.path)
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            self.path, options, providers=["CPUExecutionProvider"])
+
+    @staticmethod
+    def export(model, path):
+        """Export the classifier to ONNX with dynamic batch and sequence axes"""
+        import torch
+
+        class LogitsOnly(torch.nn.Module):
+            """Wraps a HF model so ONNX export sees plain tensors in and out"""
+
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        model = model.to("cpu").eval()
+        dummy = torch.ones((1, 8), dtype=torch.long)
+        print(f"Exporting ONNX model to {path}...")
+        torch.onnx.export(
+            LogitsOnly(model),
+            (dummy, torch.ones_like(dummy)),
+            path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=17,
+        )
+
+    def __call__(self, input_ids, attention_mask):
+        outputs = self.session.run(["logits"], {
+            "input_ids": np.asarray(input_ids, dtype=np.int64),
+            "attention_mask": np.asarray(attention_mask, dtype=np.int64),
+        })
+        return outputs[0]
+
+
+BACKENDS = {
+    'torch': TorchBackend,
+    'int8': QuantizedTorchBackend,
+    'onnx': OnnxBackend,
+}
+
+
+def create_backend(name, model, device=None, model_name="model"):
+    """Build the named backend around an already loaded HF model"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', expected one of {sorted(BACKENDS)}")
+    if name == 'onnx':
+        return OnnxBackend(model, device=device, model_name=model_name)
+    return BACKENDS[name](model, device=device)
+
+
+def softmax(logits):
+    """Row-wise softmax over NumPy logits"""
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def parity_check(reference, candidate, texts=SAMPLE_TEXTS):
+    """Compare a classifier's probabilities against a reference classifier"""
+    expected = reference.classify_batch(texts)
+    actual = candidate.classify_batch(texts)
+    return {
+        'max_abs_diff': float(np.abs(expected - actual).max()),
+        'mean_abs_diff': float(np.abs(expected - actual).mean()),
+        'top1_agreement': float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean()),
+    }
+
+
+def benchmark(classifier, texts=SAMPLE_TEXTS, runs=5, batch_size=16):
+    """Per-message latency (p50/p99 ms) and batched throughput (texts/s)"""
+    classifier.classify(texts[0])  # warm up
+
+    latencies = []
+    for _ in range(runs):
+        for text in texts:
+            start = time.perf_counter()
+            classifier.classify(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        classifier.classify_batch(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'latency_p50_ms': float(np.percentile(latencies, 50)),
+        'latency_p99_ms': float(np.percentile(latencies, 99)),
+        'throughput_per_s': runs * len(texts) / elapsed,
+    }
+
+
+def main():
+    from Feelix import EmotionClassifier
+
+    parser = argparse.ArgumentParser(description="Compare emotion model backends")
+    parser.add_argument("--model", default="j-hartmann/emotion-english-distilroberta-base")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    reference = EmotionClassifier(args.model, backend='torch')
+    results = {}
+    for name in args.backends:
+        classifier = reference if name == 'torch' else EmotionClassifier(args.model, backend=name)
+        results[name] = parity_check(reference, classifier)
+        results[name].update(benchmark(classifier, runs=args.runs))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'backend':<8} {'top1':>6} {'max diff':>9} {'p50 ms':>8} {'p99 ms':>8} {'texts/s':>9}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['top1_agreement']:>6.2f} {r['max_abs_diff']:>9.4f} "
+              f"{r['latency_p50_ms']:>8.2f} {r['latency_p99_ms']:>8.2f} {r['throughput_per_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+# inference_daemon.py
+
+"""
+Local inference daemon: load the emotion model once, share it between processes.
+
+The daemon owns one EmotionClassifier and serves requests over a Unix domain
+socket. Requests from all clients go through a single MicroBatcher, so
+concurrent front ends also share forward passes. Probability rows are not
+pickled back: every client connection gets its own shared-memory block that
+the daemon writes results into, and the reply only says how many rows are
+ready.
+
+InferenceClient is a drop-in stand-in for EmotionClassifier (classify,
+classify_batch, classify_long, to_result, labels), so N front ends cost one
+model's worth of memory:
+
+    python inference_daemon.py --model j-hartmann/emotion-english-distilroberta-base
+
+    client = InferenceClient()
+    emotion, probs = client.classify("What a day!")
+    light = EmotionalBusylight(classifier=client)
+
+The socket lives in a per-user 0700 runtime directory ($XDG_RUNTIME_DIR/feelix,
+else ~/.cache/feelix/run) and every connection must pass the
+multiprocessing.connection handshake with a secret that the server keeps in a
+0600 `<socket>.key` file next to it. Clients also check that the socket
+belongs to them before connecting, because replies are unpickled.
+
+Messages (pickled dicts over multiprocessing.connection):
+
+    {'type': 'hello'}                 -> {'labels', 'model_name', 'shm', 'capacity'}
+    {'type': 'classify', 'texts': []} -> {'rows': n}   (rows are in the shared block)
+    {'type': 'classify_long', 'text', 'options'} -> {'emotion', 'probabilities', 'timeline'}
+    any failure                       -> {'error': message}
+"""
+
+import argparse
+import os
+import secrets
+import stat
+import threading
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError, resource_tracker, shared_memory
+from multiprocessing.connection import Listener, Client
+
+import numpy as np
+
+SOCKET_NAME = 'inference.sock'
+
+# Blocks created by a daemon in this process; attaching to those must not unregister them
+_owned_blocks = set()
+
+
+def _attach(name):
+    """Open an existing shared-memory block without taking ownership of it.
+
+    Before Python 3.13 attaching registers the block with this process's
+    resource tracker, which would unlink it under the daemon when we exit.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    if name not in _owned_blocks:
+        resource_tracker.unregister(block._name, 'shared_memory')
+    return block
+
+
+def runtime_dir():
+    """Per-user directory for sockets and their keys, created 0700"""
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base:
+        path = os.path.join(base, 'feelix')
+    else:
+        path = os.path.join(os.path.expanduser('~'), '.cache', 'feelix', 'run')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    check_owner(path, private=True)
+    return path
+
+
+def default_address(name=SOCKET_NAME):
+    return os.path.join(runtime_dir(), name)
+
+
+def check_owner(path, private=False):
+    """Raise PermissionError unless path belongs to this user (and, if private, only to them)"""
+    info = os.lstat(path)
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by uid {info.st_uid}, not by this user")
+    if private and stat.S_IMODE(info.st_mode) & 0o077:
+        raise PermissionError(f"{path} is accessible to other users (mode {stat.S_IMODE(info.st_mode):o})")
+
+
+def _key_path(address):
+    return address + '.key'
+
+
+def server_authkey(address):
+    """The socket's shared secret, generated into a 0600 file on first use"""
+    path = _key_path(address)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return client_authkey(address, check_socket=False)
+    with os.fdopen(fd, 'w') as f:
+        key = secrets.token_hex(32)
+        f.write(key)
+    return key.encode()
+
+
+def client_authkey(address, check_socket=True):
+    """Read the secret for a socket, refusing sockets and key files other users could have planted"""
+    if check_socket:
+        check_owner(address)
+    path = _key_path(address)
+    check_owner(path, private=True)
+    with open(path, encoding='ascii') as f:
+        return f.read().strip().encode()
+
+
+class ModelServer:
+    """Unix-socket listener with a thread per connection and a MicroBatcher in front of the model.
+
+    Subclasses implement _serve_connection; InferenceDaemon below and
+    feelix_shard.InferenceHub are both built on this.
+    """
+
+    name = 'Model server'
+    socket_name = SOCKET_NAME
+
+    def __init__(self, classifier, address=None, authkey=None, batch_wait_ms=5):
+        from micro_batcher import MicroBatcher
+
+        self.classifier = classifier
+        self.address = address or default_address(self.socket_name)
+        # Connections are always authenticated; without an explicit key one is kept next to the socket
+        self.authkey = authkey if authkey is not None else server_authkey(self.address)
+        self.batcher = MicroBatcher(classifier, max_wait_ms=batch_wait_ms)
+        self.listener = None
+        self.running = False
+        self.lock = threading.Lock()
+
+    def serve_forever(self):
+        if os.path.lexists(self.address):
+            check_owner(self.address)
+            os.unlink(self.address)  # Stale socket from a previous run
+        self.listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        self.running = True
+        print(f"{self.name} listening on {self.address}")
+        try:
+            while self.running:
+                try:
+                    connection = self.listener.accept()
+                except (AuthenticationError, EOFError) as e:
+                    print(f"Rejected a connection that failed authentication: {e}")
+                    continue
+                except OSError:
+                    if not self.running:
+                        break
+                    raise
+                threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+        finally:
+            self.batcher.stop()
+
+    def stop(self):
+        self.running = False
+        if self.listener is not None:
+            self.listener.close()
+
+    def _serve_connection(self, connection):
+        raise NotImplementedError
+
+
+class InferenceDaemon(ModelServer):
+    name = 'Inference daemon'
+
+    def __init__(self, classifier, address=None, authkey=None, capacity=256, batch_wait_ms=5):
+        super().__init__(classifier, address, authkey, batch_wait_ms)
+        self.capacity = capacity  # Rows in each client's result block
+
+        # Statistics
+        self.clients = 0
+        self.requests = 0
+        self.texts = 0
+
+    def _serve_connection(self, connection):
+        labels = self.classifier.labels
+        block = shared_memory.SharedMemory(create=True, size=self.capacity * len(labels) * 4)
+        _owned_blocks.add(block.name)
+        results = np.ndarray((self.capacity, len(labels)), dtype=np.float32, buffer=block.buf)
+        with self.lock:
+            self.clients += 1
+        try:
+            while True:
+                message = connection.recv()
+                try:
+                    reply = self._handle(message, results, block.name)
+                except Exception as e:
+                    reply = {'error': f"{type(e).__name__}: {e}"}
+                connection.send(reply)
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self.lock:
+                self.clients -= 1
+            connection.close()
+            del results
+            block.close()
+            block.unlink()
+            _owned_blocks.discard(block.name)
+
+    def _handle(self, message, results, block_name):
+        kind = message.get('type') if isinstance(message, dict) else None
+        if kind == 'hello':
+            return {'labels': self.classifier.labels, 'model_name': self.classifier.model_name,
+                    'shm': block_name, 'capacity': self.capacity}
+        if kind == 'classify':
+            texts = message['texts']
+            if len(texts) > self.capacity:
+                raise ValueError(f"at most {self.capacity} texts per request")
+            futures = [self.batcher.submit(text) for text in texts]
+            for row, future in enumerate(futures):
+                results[row] = future.result()
+            with self.lock:
+                self.requests += 1
+                self.texts += len(texts)
+            return {'rows': len(texts)}
+        if kind == 'classify_long':
+            # On the batcher's thread: the tokenizer and model must not be shared across threads
+            emotion, probs, timeline = self.batcher.submit_call(
+                self.classifier.classify_long, message['text'], **message.get('options', {})).result()
+            return {'emotion': emotion, 'probabilities': probs, 'timeline': timeline}
+        raise ValueError(f"unknown message type {kind!r}")
+
+
+class InferenceClient:
+    """Talks to an InferenceDaemon; usable wherever an EmotionClassifier is.
+
+    If the daemon restarts, the next request reconnects once and retries.
+    If it is gone for good, requests raise OSError/EOFError, unless
+    `fallback` was given: then fallback(model_name) builds a local
+    classifier that serves every later request in this process.
+    """
+
+    def __init__(self, address=None, authkey=None, fallback=None):
+        self.address = address or default_address()
+        self.authkey = authkey  # None: read the daemon's key file on every (re)connect
+        self.fallback = fallback
+        self.local = None  # The fallback classifier, once the daemon is gone
+        self.lock = threading.Lock()
+        self.reconnects = 0
+        self.block = None
+        self._connect()
+
+        # Mirror the parts of EmotionClassifier that callers poll
+        self.cache = None
+        self.ready = Future()
+        self.ready.set_result(True)
+
+    def _connect(self):
+        # Replies are unpickled, so only talk to a socket this user owns
+        check_owner(self.address)
+        authkey = self.authkey if self.authkey is not None else client_authkey(self.address)
+        self.connection = Client(self.address, family='AF_UNIX', authkey=authkey)
+        info = self._exchange({'type': 'hello'})
+        if self.block is not None and info['labels'] != self.labels:
+            raise RuntimeError(f"Inference daemon now serves labels {info['labels']}, not {self.labels}")
+        self.labels = info['labels']
+        self.model_name = info['model_name']
+        self.capacity = info['capacity']
+        self.block = _attach(info['shm'])
+        self.results = np.ndarray((self.capacity, len(self.labels)), dtype=np.float32,
+                                  buffer=self.block.buf)
+
+    def _disconnect(self):
+        self.connection.close()
+        self.results = None
+        self.block.close()
+
+    @property
+    def is_ready(self):
+        return self.local.is_ready if self.local is not None else True
+
+    def load_async(self):
+        return self.local.load_async() if self.local is not None else self.ready
+
+    def wait_until_ready(self, timeout=None):
+        return self.local.wait_until_ready(timeout) if self.local is not None else True
+
+    def _exchange(self, message):
+        self.connection.send(message)
+        reply = self.connection.recv()
+        if 'error' in reply:
+            raise RuntimeError(f"Inference daemon: {reply['error']}")
+        return reply
+
+    def _request(self, message):
+        """Send a request (holding self.lock), reconnecting once if the daemon restarted"""
+        try:
+            return self._exchange(message)
+        except (EOFError, OSError):
+            self._disconnect()
+        try:
+            self._connect()
+        except AuthenticationError as e:
+            raise ConnectionRefusedError(f"Inference daemon at {self.address}: {e}")
+        self.reconnects += 1
+        print(f"Reconnected to the inference daemon at {self.address}")
+        return self._exchange(message)
+
+    def _fall_back(self, error):
+        """Switch this client to a local classifier; re-raises if there is no fallback"""
+        if self.fallback is None:
+            raise error
+        with self.lock:
+            if self.local is None:
+                print(f"Inference daemon unavailable ({error}); loading the model locally")
+                self.local = self.fallback(self.model_name)
+
+    def classify(self, text):
+        """Classify a single text, returning the top label and a dict of probabilities"""
+        return self.to_result(self.classify_batch([text])[0])
+
+    def to_result(self, probs):
+        label = self.labels[int(np.argmax(probs))]
+        return label, {label: float(p) for label, p in zip(self.labels, probs)}
+
+    def classify_batch(self, texts, batch_size=32, max_length=512):
+        """(N, len(self.labels)) probability matrix; batching happens in the daemon"""
+        if self.local is None:
+            try:
+                return self._classify_remote(list(texts))
+            except (EOFError, OSError) as e:
+                self._fall_back(e)
+        return self.local.classify_batch(texts, batch_size, max_length)
+
+    def _classify_remote(self, texts):
+        probs = np.zeros((len(texts), len(self.labels)), dtype=np.float32)
+        for start in range(0, len(texts), self.capacity):
+            chunk = texts[start:start + self.capacity]
+            with self.lock:
+                rows = self._request({'type': 'classify', 'texts': chunk})['rows']
+                probs[start:start + rows] = self.results[:rows]
+        return probs
+
+    def classify_long(self, text, **options):
+        if self.local is None:
+            try:
+                with self.lock:
+                    reply = self._request({'type': 'classify_long', 'text': text, 'options': options})
+                return reply['emotion'], reply['probabilities'], reply['timeline']
+            except (EOFError, OSError) as e:
+                self._fall_back(e)
+        return self.local.classify_long(text, **options)
+
+    def close(self):
+        with self.lock:
+            self._disconnect()
+
+
+def connect_daemon(address=None, authkey=None, fallback=None):
+    """InferenceClient for a running daemon, or None if there isn't one we can trust"""
+    address = address or default_address()
+    if not os.path.exists(address):
+        return None
+    try:
+        return InferenceClient(address, authkey, fallback)
+    except (OSError, EOFError, AuthenticationError) as e:
+        print(f"Inference daemon at {address} not reachable: {e}")
+        return None
+
+
+def main():
+    from Feelix import EmotionClassifier
+    from classification_cache import ClassificationCache
+
+    parser = argparse.ArgumentParser(description="Serve one emotion model to many local processes")
+    parser.add_argument("--socket", help="Unix socket path (default: in the per-user runtime directory)")
+    parser.add_argument("--authkey", help="Shared secret for the socket (default: generated into <socket>.key)")
+    parser.add_argument("--model", default="j-hartmann/emotion-english-distilroberta-base")
+    parser.add_argument("--backend", default="torch", choices=["torch", "int8", "onnx"])
+    parser.add_argument("--cache-path", help="sqlite file for the persistent classification cache")
+    parser.add_argument("--capacity", type=int, default=256, help="Result rows per client")
+    parser.add_argument("--batch-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    classifier = EmotionClassifier(args.model, cache=ClassificationCache(disk_path=args.cache_path),
+                                   backend=args.backend, load_in_background=True)
+    daemon = InferenceDaemon(classifier, args.socket, args.authkey.encode() if args.authkey else None,
+                             capacity=args.capacity, batch_wait_ms=args.batch_wait_ms)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
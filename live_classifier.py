@@ -0,0 +1,119 @@
+# live_classifier.py
+
+"""
+Debounced, incremental classification of text while it is being typed.
+
+update() is cheap and can be called on every keystroke. A background worker
+waits until the text has been still for the debounce interval, classifies
+the latest version, and throws the result away if newer text arrived while
+it ran. on_change only fires when the top label changes and leads the
+runner-up by at least min_margin, so inference calls and light writes track
+meaningful changes rather than keystrokes.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+class LiveClassifier:
+    def __init__(self, classifier, on_change, debounce_ms=400, min_margin=0.15, min_chars=3):
+        self.classifier = classifier
+        self.on_change = on_change  # Called as on_change(label, {label: prob}) on the worker thread; keep it cheap
+        self.debounce = debounce_ms / 1000.0
+        self.min_margin = min_margin
+        self.min_chars = min_chars
+
+        self.condition = threading.Condition()
+        self.text = ""
+        self.generation = 0
+        self.updated_at = 0.0
+        self.classified_text = None
+        self.current_label = None
+        self.running = True
+
+        # Statistics
+        self.updates = 0
+        self.inferences = 0
+        self.stale = 0
+        self.changes = 0
+
+        self.worker = threading.Thread(target=self._live_loop, daemon=True, name="live-classifier")
+        self.worker.start()
+
+    def update(self, text):
+        """Record the latest text; any in-flight result for older text will be dropped"""
+        with self.condition:
+            if text == self.text:
+                return
+            self.text = text
+            self.generation += 1
+            self.updated_at = time.monotonic()
+            self.updates += 1
+            self.condition.notify()
+
+    def reset(self):
+        """Forget the current label, e.g. after the text was submitted"""
+        with self.condition:
+            self.current_label = None
+            self.classified_text = None
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def _next_request(self):
+        """Wait for text that has settled for the debounce interval"""
+        with self.condition:
+            while self.running:
+                pending = self.text.strip() != (self.classified_text or "").strip()
+                if not pending:
+                    self.condition.wait()
+                    continue
+                remaining = self.updated_at + self.debounce - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+                self.classified_text = self.text
+                return self.text, self.generation
+            return None
+
+    def _live_loop(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                return
+            text, generation = request
+            if len(text.strip()) < self.min_chars:
+                continue
+
+            try:
+                probs = self.classifier.classify_batch([text])[0]
+            except Exception as e:
+                print(f"Live classification error: {e}")
+                continue
+            self.inferences += 1
+
+            with self.condition:
+                if generation != self.generation:
+                    self.stale += 1
+                    continue
+                ranked = np.sort(probs)
+                margin = float(ranked[-1] - ranked[-2])
+                label, emotion_probs = self.classifier.to_result(probs)
+                if label == self.current_label or margin < self.min_margin:
+                    continue
+                self.current_label = label
+                self.changes += 1
+            self.on_change(label, emotion_probs)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'updates': self.updates,
+                'inferences': self.inferences,
+                'stale_discarded': self.stale,
+                'label_changes': self.changes,
+            }
@@ -0,0 +1,245 @@
+# metrics.py
+
+"""
+In-process metrics for the hot path.
+
+Stages are timed with spans and aggregated into fixed-bucket histograms,
+alongside plain counters; nothing leaves the process unless asked:
+
+    with METRICS.span('forward'):
+        logits = backend(ids, mask)
+    METRICS.inc('cache_hits', hits)
+
+    METRICS.render_prometheus()    # text exposition format, e.g. for /metrics
+    METRICS.summary()              # one log line with counts and p50/p99
+    METRICS.start_reporter(60)     # ...printed every 60 seconds
+
+StackSampler is an opt-in profiler that can be switched on and off while the
+process runs (install_profile_signal() binds it to SIGUSR2). It samples every
+thread's stack from a background thread and writes collapsed stacks, the
+format flamegraph.pl, speedscope and py-spy's raw output use.
+"""
+
+import bisect
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, recent=1024):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=recent)  # Latest samples, for quantiles in log lines
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+
+    def quantile(self, q):
+        with self.lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.sum
+
+
+class Metrics:
+    def __init__(self, prefix='feelix'):
+        self.prefix = prefix
+        self.enabled = True
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.reporter = None
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            self.histogram(name).observe(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Time the enclosed block into the `name` histogram"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe(time.perf_counter() - start)
+
+    def inc(self, name, value=1):
+        if self.enabled and value:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        for name, value in counters:
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, histogram in histograms:
+            metric = f"{self.prefix}_{name}_seconds"
+            counts, count, total = histogram.snapshot()
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{metric}_sum {total}")
+            lines.append(f"{metric}_count {count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One line with every span's count and recent p50/p99, then the counters"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        parts = [f"{name} n={h.count} p50={h.quantile(0.5) * 1000:.2f}ms p99={h.quantile(0.99) * 1000:.2f}ms"
+                 for name, h in histograms]
+        parts += [f"{name}={value}" for name, value in counters]
+        return '; '.join(parts) if parts else 'no metrics recorded'
+
+    def start_reporter(self, interval=60.0, log=print):
+        """Log summary() every `interval` seconds from a daemon thread"""
+        if self.reporter is not None:
+            return
+        stop = threading.Event()
+
+        def report_loop():
+            while not stop.wait(interval):
+                log(f"Metrics: {self.summary()}")
+
+        self.reporter = (threading.Thread(target=report_loop, daemon=True, name="metrics-reporter"), stop)
+        self.reporter[0].start()
+
+    def stop_reporter(self):
+        if self.reporter is not None:
+            self.reporter[1].set()
+            self.reporter = None
+
+
+class StackSampler:
+    """Samples every thread's Python stack at a fixed rate while enabled.
+
+    Cheap enough to leave installed in production; it costs nothing until
+    started. Output is one "frame;frame;frame count" line per unique stack.
+    """
+
+    def __init__(self, interval=0.005, path='feelix-profile.folded'):
+        self.interval = interval
+        self.path = path
+        self.stacks = Counter()
+        self.samples = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self, duration=None):
+        """Start sampling; stops by itself (and writes the profile) after `duration` seconds"""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.stacks = Counter()
+            self.samples = 0
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._sample_loop, args=(duration,), daemon=True,
+                                           name="stack-sampler")
+            self.thread.start()
+        print(f"Profiling started, sampling every {self.interval * 1000:.1f}ms")
+
+    def stop(self):
+        """Stop sampling and write the collected stacks; returns the output path"""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is None:
+            return None
+        self.stop_event.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        return self.write()
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def _sample_loop(self, duration):
+        own_id = threading.get_ident()
+        deadline = None if duration is None else time.monotonic() + duration
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                self.stop()
+                return
+
+    def write(self):
+        with open(self.path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"Profiling stopped: {self.samples} samples written to {self.path}")
+        return self.path
+
+
+METRICS = Metrics()
+PROFILER = StackSampler()
+
+
+def install_profile_signal(sampler=PROFILER, signum=getattr(signal, 'SIGUSR2', None)):
+    """Toggle the sampler with `kill -USR2 <pid>`; a no-op where the signal doesn't exist"""
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signum, lambda *_: sampler.toggle())
+    return True
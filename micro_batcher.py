@@ -0,0 +1,140 @@
+# micro_batcher.py
+
+"""
+Micro-batching front end for EmotionClassifier.
+
+Callers on any thread submit single texts; a background worker collects
+whatever arrives within a short window (or until the batch is full) and runs
+it through EmotionClassifier.classify_batch as one padded forward pass.
+Other model calls (e.g. classify_long) can be handed to the same thread with
+submit_call, so the tokenizer and model are only ever used from one thread.
+"""
+
+import functools
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+import numpy as np
+
+
+class MicroBatcher:
+    def __init__(self, classifier, max_batch_size=32, max_wait_ms=5):
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = Queue()
+        self.running = True
+
+        # Simple counters for tuning the batch window
+        self.batches_run = 0
+        self.texts_classified = 0
+
+        self.worker = threading.Thread(target=self._batch_loop, daemon=True)
+        self.worker.start()
+
+    @property
+    def labels(self):
+        return self.classifier.labels
+
+    def submit(self, text):
+        """Queue a text for classification; returns a Future of its probability row"""
+        future = Future()
+        if not self.running:
+            future.set_exception(RuntimeError("MicroBatcher is stopped"))
+            return future
+        self.requests.put((text, future))
+        return future
+
+    def submit_call(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the batching thread, between batches; returns a Future"""
+        future = Future()
+        if not self.running:
+            future.set_exception(RuntimeError("MicroBatcher is stopped"))
+            return future
+        self.requests.put((functools.partial(fn, *args, **kwargs), future))
+        return future
+
+    def classify(self, text, timeout=None):
+        """Drop-in replacement for EmotionClassifier.classify"""
+        probs = self.submit(text).result(timeout=timeout)
+        return self.classifier.to_result(probs)
+
+    def classify_batch(self, texts, batch_size=32, max_length=512):
+        """Drop-in replacement for EmotionClassifier.classify_batch: an (N, labels) matrix.
+
+        The texts join the shared queue, so the worker's max_batch_size sets
+        the batching; batch_size and max_length are accepted for compatibility.
+        """
+        futures = [self.submit(text) for text in texts]
+        if not futures:
+            return np.zeros((0, len(self.labels)), dtype=np.float32)
+        return np.vstack([future.result() for future in futures])
+
+    def stop(self):
+        """Stop the worker after it finishes the batch in progress"""
+        self.running = False
+        self.requests.put(None)
+        self.worker.join(timeout=5)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes"""
+        first = self.requests.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except Empty:
+                break
+            if item is None:
+                self.requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run_batch(self, batch):
+        try:
+            probs = self.classifier.classify_batch(
+                [text for text, _ in batch], batch_size=self.max_batch_size)
+        except Exception as e:
+            print(f"Batch classification error: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.texts_classified += len(batch)
+        for row, (_, future) in zip(probs, batch):
+            future.set_result(row)
+
+    def _batch_loop(self):
+        while self.running:
+            batch = self._collect()
+            # Skip callers that gave up before we got to them
+            batch = [(text, future) for text, future in batch
+                     if future.set_running_or_notify_cancel()]
+            calls = [(call, future) for call, future in batch if callable(call)]
+            batch = [(text, future) for text, future in batch if not callable(text)]
+            if batch:
+                self._run_batch(batch)
+            for call, future in calls:
+                try:
+                    future.set_result(call())
+                except Exception as e:
+                    future.set_exception(e)
+
+        # Fail anything still waiting so callers don't hang
+        while True:
+            try:
+                item = self.requests.get_nowait()
+            except Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("MicroBatcher is stopped"))
@@ -0,0 +1,305 @@
+# speech_pipeline.py
+
+"""
+Streaming speech capture off the UI thread.
+
+A capture thread reads fixed-size PCM frames from a source (the microphone
+or a WAV file), keeps the most recent ones in a ring buffer, and cuts them
+into phrases with a simple energy-based voice activity detector. Finished
+phrases go to a recognition thread running a pluggable recognizer backend,
+and recognized text comes out of a queue the main loop can poll without
+blocking.
+
+Replay a recording through the pipeline, with no microphone needed:
+
+    python speech_pipeline.py recording.wav --recognizer sphinx
+"""
+
+import argparse
+import threading
+import time
+import wave
+from collections import deque
+from queue import Queue, Empty
+
+import numpy as np
+import speech_recognition as sr
+
+
+class MicrophoneSource:
+    """16-bit mono frames from the default microphone"""
+
+    def __init__(self, sample_rate=16000, frame_samples=480, device_index=None):
+        self.sample_rate = sample_rate
+        self.sample_width = 2
+        self.frame_samples = frame_samples
+        self.microphone = sr.Microphone(device_index=device_index, sample_rate=sample_rate,
+                                        chunk_size=frame_samples)
+        self.stream = None
+
+    def open(self):
+        self.microphone.__enter__()
+        self.stream = self.microphone.stream
+
+    def read(self):
+        return self.stream.read(self.frame_samples)
+
+    def close(self):
+        if self.stream is not None:
+            self.microphone.__exit__(None, None, None)
+            self.stream = None
+
+
+class WavFileSource:
+    """Replays a 16-bit WAV file as frames; realtime=True paces it like a microphone"""
+
+    def __init__(self, path, frame_samples=480, realtime=False):
+        self.path = path
+        self.frame_samples = frame_samples
+        self.realtime = realtime
+        self.wav = None
+        self.next_frame_time = None
+        with wave.open(path, 'rb') as wav:
+            self.sample_rate = wav.getframerate()
+            self.sample_width = wav.getsampwidth()
+            self.channels = wav.getnchannels()
+        if self.sample_width != 2:
+            raise ValueError(f"{path}: only 16-bit WAV files are supported")
+
+    def open(self):
+        self.wav = wave.open(self.path, 'rb')
+        self.next_frame_time = time.monotonic()
+
+    def read(self):
+        """Next frame as mono PCM bytes, or None at the end of the file"""
+        data = self.wav.readframes(self.frame_samples)
+        if not data:
+            return None
+        if self.channels > 1:
+            samples = np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+            data = samples.mean(axis=1).astype(np.int16).tobytes()
+        if self.realtime:
+            self.next_frame_time += self.frame_samples / self.sample_rate
+            delay = self.next_frame_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return data
+
+    def close(self):
+        if self.wav is not None:
+            self.wav.close()
+            self.wav = None
+
+
+class EnergyVAD:
+    """Flags frames as speech when their RMS rises well above a tracked noise floor"""
+
+    def __init__(self, ratio=3.0, min_threshold=300.0, floor_adapt=0.05):
+        self.ratio = ratio
+        self.min_threshold = min_threshold
+        self.floor_adapt = floor_adapt
+        self.noise_floor = None
+
+    def is_speech(self, frame):
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        speech = rms > max(self.min_threshold, self.noise_floor * self.ratio)
+        if not speech:
+            # Only learn the floor from non-speech frames
+            self.noise_floor += self.floor_adapt * (rms - self.noise_floor)
+        return speech
+
+
+def google_recognizer(recognizer=None):
+    """Online Google Web Speech backend (the original SpeechInput behaviour)"""
+    recognizer = recognizer or sr.Recognizer()
+    return recognizer.recognize_google
+
+
+def sphinx_recognizer(recognizer=None):
+    """Offline CMU Sphinx backend (needs pocketsphinx)"""
+    recognizer = recognizer or sr.Recognizer()
+    return recognizer.recognize_sphinx
+
+
+RECOGNIZERS = {
+    'google': google_recognizer,
+    'sphinx': sphinx_recognizer,
+}
+
+
+class SpeechPipeline:
+    """Capture thread -> VAD segmentation -> recognition thread -> text queue.
+
+    recognizer is any callable taking a speech_recognition.AudioData and
+    returning text. With push_to_talk=True only audio captured while
+    set_active(True) is in effect is segmented; releasing ends the phrase.
+    """
+
+    def __init__(self, source, recognizer, push_to_talk=False, vad=None,
+                 preroll_ms=300, silence_ms=600, min_phrase_ms=200, max_phrase_ms=15000):
+        self.source = source
+        self.recognizer = recognizer
+        self.push_to_talk = push_to_talk
+        self.vad = vad or EnergyVAD()
+
+        frame_ms = 1000 * source.frame_samples / source.sample_rate
+        self.ring = deque(maxlen=max(1, int(preroll_ms / frame_ms)))  # Pre-roll frames
+        self.silence_frames = max(1, int(silence_ms / frame_ms))
+        self.min_phrase_frames = max(1, int(min_phrase_ms / frame_ms))
+        self.max_phrase_frames = max(1, int(max_phrase_ms / frame_ms))
+
+        self.active = not push_to_talk
+        self.running = False
+        self.finished = threading.Event()  # Set when the source runs dry
+        self.segments = Queue()  # (captured_at, AudioData) waiting for recognition
+        self.results = Queue()   # Recognized text for the main loop
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.frames_read = 0
+        self.phrases = 0
+        self.recognized = 0
+        self.recognition_time = 0.0
+
+        self._phrase = []
+        self._silent_run = 0
+
+    def start(self):
+        self.running = True
+        self.source.open()
+        threading.Thread(target=self._capture_loop, daemon=True, name="speech-capture").start()
+        threading.Thread(target=self._recognize_loop, daemon=True, name="speech-recognize").start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.segments.put(None)
+
+    def set_active(self, active):
+        """Push-to-talk gate; releasing it ends the current phrase"""
+        with self.lock:
+            if active and not self.active:
+                # Start the phrase with the pre-roll so the first syllable isn't clipped
+                self._phrase = list(self.ring)
+                self._silent_run = 0
+            elif not active and self.active:
+                self._end_phrase()
+            self.active = active
+
+    @property
+    def busy(self):
+        """True while audio is being captured as a phrase or still being recognized"""
+        with self.lock:
+            return bool(self._phrase) or self.in_flight > 0 or not self.results.empty()
+
+    def poll(self):
+        """Recognized phrases so far, without blocking"""
+        texts = []
+        while True:
+            try:
+                texts.append(self.results.get_nowait())
+            except Empty:
+                return texts
+
+    def _capture_loop(self):
+        try:
+            while self.running:
+                frame = self.source.read()
+                if frame is None:
+                    break
+                self.frames_read += 1
+                with self.lock:
+                    self._process_frame(frame)
+        except Exception as e:
+            print(f"Speech capture error: {e}")
+        finally:
+            with self.lock:
+                self._end_phrase()
+            self.source.close()
+            self.segments.put(None)
+
+    def _process_frame(self, frame):
+        speech = self.vad.is_speech(frame)
+        self.ring.append(frame)
+        if not self.active:
+            return
+
+        if not self._phrase:
+            if speech:
+                self._phrase = list(self.ring)
+                self._silent_run = 0
+            return
+
+        self._phrase.append(frame)
+        self._silent_run = 0 if speech else self._silent_run + 1
+        if self._silent_run >= self.silence_frames or len(self._phrase) >= self.max_phrase_frames:
+            self._end_phrase()
+
+    def _end_phrase(self):
+        phrase, self._phrase = self._phrase, []
+        self._silent_run = 0
+        if len(phrase) < self.min_phrase_frames:
+            return
+        audio = sr.AudioData(b''.join(phrase), self.source.sample_rate, self.source.sample_width)
+        self.phrases += 1
+        self.in_flight += 1
+        self.segments.put((time.perf_counter(), audio))
+
+    def _recognize_loop(self):
+        while True:
+            item = self.segments.get()
+            if item is None:
+                break
+            captured_at, audio = item
+            try:
+                text = self.recognizer(audio)
+            except sr.UnknownValueError:
+                text = None
+            except sr.RequestError as e:
+                print(f"Could not request results; {e}")
+                text = None
+            except Exception as e:
+                print(f"Speech recognition error: {e}")
+                text = None
+            self.recognition_time += time.perf_counter() - captured_at
+            if text:
+                self.recognized += 1
+                self.results.put(text)
+            with self.lock:
+                self.in_flight -= 1
+        self.finished.set()
+
+    def stats(self):
+        return {
+            'frames_read': self.frames_read,
+            'phrases': self.phrases,
+            'recognized': self.recognized,
+            'avg_recognition_ms': self.recognition_time / self.phrases * 1000 if self.phrases else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a WAV file through the speech pipeline")
+    parser.add_argument("wav")
+    parser.add_argument("--recognizer", default="sphinx", choices=list(RECOGNIZERS))
+    parser.add_argument("--realtime", action="store_true", help="Pace playback like a live microphone")
+    args = parser.parse_args()
+
+    source = WavFileSource(args.wav, realtime=args.realtime)
+    pipeline = SpeechPipeline(source, RECOGNIZERS[args.recognizer]())
+    start = time.perf_counter()
+    pipeline.start()
+    pipeline.finished.wait()
+    elapsed = time.perf_counter() - start
+
+    for text in pipeline.poll():
+        print(text)
+    print(f"{pipeline.stats()} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# test_busylight_protocol.py
+
+"""
+The generated command tables must match the hand-written ones they replaced,
+and validate_packet must catch packets the light would misread.
+"""
+
+import pytest
+
+from busylight_commands import COMMANDS, KEEPALIVE
+from busylight_protocol import (
+    CHECKSUM_OFFSET, MAX_INTENSITY, PACKET_SIZE, STEP_OFFSET, STEP_SIZE,
+    PacketError, Step, build_program, checksum, decode_packet, finalize, validate_packet,
+)
+
+# The pre-generator tables, spelled out the way busylight_commands.py used to:
+# a single step with the color, 48 zero bytes, the footer and a hard-coded checksum
+_OLD_FOOTER = [0x06, 0x04, 0x55, 0xFF, 0xFF, 0xFF]
+_OLD_COLORS = {
+    'red': (0x64, 0x00, 0x00, 0x04, 0x52),
+    'green': (0x22, 0x42, 0x00, 0x04, 0x52),
+    'blue': (0x00, 0x00, 0x64, 0x04, 0x52),
+    'yellow': (0x32, 0x32, 0x00, 0x04, 0x52),
+    'purple': (0x32, 0x00, 0x32, 0x04, 0x52),
+    'brown': (0x4B, 0x14, 0x05, 0x04, 0x52),
+    'pink': (0x3C, 0x0A, 0x1E, 0x04, 0x52),
+    'orange': (0x52, 0x12, 0x00, 0x04, 0x52),
+    'white': (0x22, 0x22, 0x20, 0x04, 0x52),
+    'cyan': (0x00, 0x32, 0x32, 0x04, 0x52),
+    'off': (0x00, 0x00, 0x00, 0x03, 0xEE),
+}
+OLD_COMMANDS = {
+    name: [0x00, 0x10, 0x01, r, g, b, 0x01, 0x00, 0x80] + [0x00] * 48 + _OLD_FOOTER + [hi, lo]
+    for name, (r, g, b, hi, lo) in _OLD_COLORS.items()
+}
+# The old keepalive list was 57 bytes: it was missing eight zero bytes before the footer
+OLD_KEEPALIVE = [0x00, 0x8F] + [0x00] * 47 + _OLD_FOOTER + [0x03, 0xEB]
+
+
+@pytest.mark.parametrize('name', sorted(OLD_COMMANDS))
+def test_commands_match_the_old_tables(name):
+    assert len(OLD_COMMANDS[name]) == PACKET_SIZE
+    assert COMMANDS[name] == bytes(OLD_COMMANDS[name])
+
+
+def test_no_commands_added_or_lost():
+    assert set(COMMANDS) == set(OLD_COMMANDS)
+
+
+def test_keepalive_is_the_old_one_padded_to_full_size():
+    assert len(OLD_KEEPALIVE) == 57
+    padded = OLD_KEEPALIVE[:49] + [0x00] * 8 + OLD_KEEPALIVE[49:]
+    assert KEEPALIVE == bytes(padded)
+
+
+@pytest.mark.parametrize('packet', list(COMMANDS.values()) + [KEEPALIVE])
+def test_shipped_packets_validate(packet):
+    assert validate_packet(packet) == packet
+
+
+def test_finalize_writes_the_checksum():
+    packet = bytearray(COMMANDS['red'])
+    packet[CHECKSUM_OFFSET:] = b'\x00\x00'
+    assert finalize(packet) == COMMANDS['red']
+    assert checksum(COMMANDS['red']) == 0x0452
+
+
+def test_rejects_bad_checksum():
+    packet = bytearray(COMMANDS['green'])
+    packet[CHECKSUM_OFFSET + 1] ^= 0x01
+    with pytest.raises(PacketError, match='checksum'):
+        validate_packet(packet)
+
+
+def test_rejects_payload_changed_without_new_checksum():
+    packet = bytearray(COMMANDS['green'])
+    packet[STEP_OFFSET + 2] = 0x10  # red intensity
+    with pytest.raises(PacketError, match='checksum'):
+        validate_packet(packet)
+
+
+@pytest.mark.parametrize('target', [7, 8, 15])
+def test_rejects_jump_to_missing_step(target):
+    packet = bytearray(COMMANDS['blue'])
+    packet[STEP_OFFSET] = 0x10 | target
+    with pytest.raises(PacketError, match='jumps to missing step'):
+        validate_packet(finalize(packet))
+
+
+def test_rejects_intensity_above_maximum():
+    packet = bytearray(COMMANDS['red'])
+    packet[STEP_OFFSET + 2] = MAX_INTENSITY + 1
+    with pytest.raises(PacketError, match='exceeds'):
+        validate_packet(finalize(packet))
+
+
+def test_rejects_wrong_length_and_report_id():
+    with pytest.raises(PacketError):
+        validate_packet(COMMANDS['red'][:-1])
+    packet = bytearray(COMMANDS['red'])
+    packet[0] = 0x01
+    with pytest.raises(PacketError, match='report id'):
+        validate_packet(packet)
+
+
+def test_program_round_trip():
+    steps = [Step(100, 0, 0, on_time=5), Step(0, 0, 100, on_time=5, off_time=2)]
+    decoded = decode_packet(build_program(steps, loop=True))
+    assert [target for target, _ in decoded] == [1, 0]
+    assert [step for _, step in decoded] == steps
+
+
+def test_program_without_loop_holds_last_step():
+    packet = build_program([Step(10, 20, 30), Step(0, 0, 0)], loop=False)
+    assert packet[STEP_OFFSET + STEP_SIZE] == 0x10 | 1
+
+
+def test_program_rejects_too_many_steps_and_bad_intensity():
+    with pytest.raises(PacketError):
+        build_program([Step(1, 1, 1)] * 8)
+    with pytest.raises(PacketError):
+        build_program([Step(MAX_INTENSITY + 1, 0, 0)])
@@ -0,0 +1,49 @@
+# test_device_registry.py
+
+"""
+DeviceRegistry backoff for lights that stay enumerated but fail their writes.
+"""
+
+from device_registry import DeviceRegistry
+from fake_hid import FakeHIDBackend
+
+PATH = b'fake:0'
+
+
+def failing_registry():
+    registry = DeviceRegistry(FakeHIDBackend(), min_backoff=0.5, max_backoff=2.0)
+    registry.scan()
+    return registry
+
+
+def fail_and_reopen(registry):
+    """Evict the light for a write error and reopen it once its backoff is over"""
+    registry.evict(PATH, IOError("write failed"))
+    _, backoff = registry.retry[PATH]
+    registry.retry[PATH] = (0.0, backoff)  # Skip the wait
+    added, _ = registry.scan()
+    assert added == [PATH]
+    return backoff
+
+
+def test_write_failures_double_the_backoff_up_to_the_maximum():
+    registry = failing_registry()
+    assert [fail_and_reopen(registry) for _ in range(4)] == [0.5, 1.0, 2.0, 2.0]
+
+
+def test_backoff_survives_reopening_and_resets_after_a_write():
+    registry = failing_registry()
+    fail_and_reopen(registry)
+    assert fail_and_reopen(registry) == 1.0
+    registry.write_succeeded(PATH)
+    assert fail_and_reopen(registry) == 0.5
+
+
+def test_unplugged_light_starts_over():
+    registry = failing_registry()
+    fail_and_reopen(registry)
+    registry.hid.unplug(PATH)
+    registry.scan()
+    registry.hid.plug(PATH)
+    registry.scan()
+    assert fail_and_reopen(registry) == 0.5
@@ -0,0 +1,173 @@
+# test_feelix_server.py
+
+"""
+FeelixServer endpoints through aiohttp's test client, driving simulated lights
+(fake_hid). A fixed classifier stands in for the emotion model so every
+request gets the same, known result.
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from Feelix import EmotionalBusylight
+from fake_hid import FakeHIDBackend
+from feelix_server import FeelixServer
+
+LABELS = ['anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise']
+
+
+class FixedClassifier:
+    """Classifies every text as mostly joy"""
+
+    labels = LABELS
+    cache = None
+    is_ready = True
+
+    def classify_batch(self, texts, batch_size=32, max_length=512):
+        probs = np.full((len(texts), len(LABELS)), 0.05, dtype=np.float32)
+        probs[:, LABELS.index('joy')] = 0.7
+        return probs
+
+    def to_result(self, probs):
+        return LABELS[int(np.argmax(probs))], {label: float(p) for label, p in zip(LABELS, probs)}
+
+
+@pytest.fixture
+def make_server():
+    """Builds FeelixServers on one simulated light; yields the factory"""
+    lights = []
+
+    def make(**options):
+        light = EmotionalBusylight(hid_backend=FakeHIDBackend(1), speak=False, load_model=False,
+                                   classifier=FixedClassifier())
+        lights.append(light)
+        return FeelixServer(light, **options)
+
+    yield make
+    for light in lights:
+        light.disconnect()
+
+
+def call(server, scenario):
+    """Run scenario(client) against the server's app and return what it returns.
+
+    Shutting the app down turns the lights off, so scenarios check the lights
+    themselves before returning.
+    """
+    async def run():
+        async with TestClient(TestServer(server.make_app())) as client:
+            return await scenario(client)
+    return asyncio.run(run())
+
+
+def test_classify_returns_emotion_and_probabilities(make_server):
+    server = make_server()
+
+    async def scenario(client):
+        response = await client.post('/classify', json={'text': 'what a great day'})
+        # Classifying alone never touches the lights
+        assert server.light.last_command is None
+        return response.status, await response.json()
+
+    status, body = call(server, scenario)
+    assert status == 200
+    assert body['emotion'] == 'joy'
+    assert body['probabilities']['joy'] == pytest.approx(0.7)
+
+
+def test_express_writes_a_packet_to_the_light(make_server):
+    server = make_server()
+    device = server.light.hid.devices()[0]
+
+    async def scenario(client):
+        response = await client.post('/express', json={'text': 'what a great day', 'speak': False})
+        assert server.light.writer.flush(5)
+        assert server.light.display_state[0] == 'joy'
+        assert server.light.last_command is not None
+        assert device.last_packet == server.light.last_command
+        return response.status
+
+    assert call(server, scenario) == 200
+
+
+@pytest.mark.parametrize('speak', ['false', 0, None, [True]])
+def test_express_rejects_non_boolean_speak(make_server, speak):
+    server = make_server()
+
+    async def scenario(client):
+        response = await client.post('/express', json={'text': 'hello', 'speak': speak})
+        assert server.light.last_command is None
+        return response.status
+
+    assert call(server, scenario) == 400
+
+
+def test_bad_bodies_are_rejected(make_server):
+    server = make_server()
+
+    async def scenario(client):
+        statuses = []
+        for kwargs in ({'data': 'not json'}, {'json': ['text']}, {'json': {'text': '  '}}):
+            response = await client.post('/classify', **kwargs)
+            statuses.append(response.status)
+        return statuses
+
+    assert call(server, scenario) == [400, 400, 400]
+
+
+def test_rate_limit_returns_429(make_server):
+    server = make_server(rate=0.001, burst=2)
+
+    async def scenario(client):
+        statuses = []
+        for _ in range(3):
+            response = await client.post('/classify', json={'text': 'hi'},
+                                         headers={'X-Client-Id': 'bot'})
+            statuses.append((response.status, response.headers.get('Retry-After')))
+        # Other clients have their own bucket
+        response = await client.post('/classify', json={'text': 'hi'},
+                                     headers={'X-Client-Id': 'other'})
+        statuses.append((response.status, None))
+        return statuses
+
+    assert call(server, scenario) == [(200, None), (200, None), (429, '1'), (200, None)]
+    assert server.rate_limiter.rejected == 1
+
+
+def test_full_server_returns_503(make_server):
+    server = make_server(max_in_flight=0)
+
+    async def scenario(client):
+        response = await client.post('/express', json={'text': 'hi'})
+        assert server.light.last_command is None
+        return response.status, response.headers.get('Retry-After')
+
+    assert call(server, scenario) == (503, '1')
+    assert server.overloaded == 1
+
+
+def test_websocket_classifies_and_expresses(make_server):
+    server = make_server()
+    device = server.light.hid.devices()[0]
+
+    async def scenario(client):
+        replies = []
+        async with client.ws_connect('/ws') as ws:
+            for message in ('plain text', '{"text": "json text"}', '{"text": "hi", "express": "yes"}',
+                            '{"text": "hi", "express": true}'):
+                await ws.send_str(message)
+                replies.append(await ws.receive_json())
+                if len(replies) == 3:
+                    # Classifying and rejected requests leave the lights alone
+                    assert server.light.last_command is None
+        assert server.light.writer.flush(5)
+        assert server.light.last_command is not None
+        assert device.last_packet == server.light.last_command
+        return replies
+
+    plain, classified, rejected, expressed = call(server, scenario)
+    assert plain['emotion'] == classified['emotion'] == expressed['emotion'] == 'joy'
+    assert rejected == {'error': "'express' must be true or false"}
@@ -0,0 +1,172 @@
+# test_hid_writer.py
+
+"""
+DeviceWriter and HIDWriteScheduler against simulated lights (fake_hid).
+
+Each test holds the writer thread inside its first write with a gate, so what
+gets queued behind it does not depend on thread timing.
+"""
+
+import threading
+import time
+
+import pytest
+
+from busylight_commands import COMMANDS
+from busylight_packets import color_packet
+from busylight_protocol import PacketError
+from fake_hid import FakeHIDBackend, FakeHIDDevice
+from hid_writer import DeviceWriter, HIDWriteScheduler
+
+
+def gated_device():
+    """An open FakeHIDDevice whose writes wait until the returned event is set"""
+    device = FakeHIDDevice()
+    device.open_path(b'fake:0')
+    gate = threading.Event()
+    write = device.write
+
+    def gated_write(data):
+        assert gate.wait(5), "test never opened the gate"
+        return write(data)
+
+    device.write = gated_write
+    return device, gate
+
+
+def wait_until_busy(writer, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not writer.busy:
+        assert time.monotonic() < deadline, "writer never started its first write"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def blocked_writer():
+    """A DeviceWriter stuck writing COMMANDS['off']; yields (writer, device, gate)"""
+    device, gate = gated_device()
+    writer = DeviceWriter(device, 'light', max_queue=3)
+    writer.submit(COMMANDS['off'])
+    wait_until_busy(writer)
+    yield writer, device, gate
+    gate.set()
+    writer.stop()
+
+
+def written(device):
+    return [packet for _, packet in device.packets]
+
+
+def test_same_key_coalesces_to_latest(blocked_writer):
+    writer, device, gate = blocked_writer
+    for name in ('red', 'green', 'blue'):
+        writer.submit(COMMANDS[name])
+    gate.set()
+    assert writer.flush(timeout=5)
+
+    assert written(device) == [COMMANDS['off'], COMMANDS['blue']]
+    stats = writer.stats()
+    assert stats['writes'] == 2
+    assert stats['coalesced'] == 2
+    assert stats['drops'] == 0
+
+
+def test_full_queue_drops_oldest(blocked_writer):
+    writer, device, gate = blocked_writer
+    names = ['red', 'green', 'blue', 'yellow', 'purple']
+    for name in names:
+        writer.submit(COMMANDS[name], key=name)
+    gate.set()
+    assert writer.flush(timeout=5)
+
+    # max_queue=3: red and green were pushed out, the rest are written in order
+    assert written(device) == [COMMANDS['off']] + [COMMANDS[name] for name in names[2:]]
+    stats = writer.stats()
+    assert stats['drops'] == 2
+    assert stats['coalesced'] == 0
+    assert stats['queued'] == 0
+
+
+def test_write_errors_are_counted_and_reported():
+    device = FakeHIDDevice()
+    device.open_path(b'fake:0')
+    device.fail_writes = True
+    errors = []
+    writer = DeviceWriter(device, 'light', on_error=lambda w, e: errors.append((w, e)))
+    try:
+        writer.submit(COMMANDS['red'])
+        assert writer.flush(timeout=5)
+    finally:
+        writer.stop()
+
+    assert writer.stats()['errors'] == 1
+    assert writer.stats()['writes'] == 0
+    assert len(errors) == 1 and errors[0][0] is writer
+    assert device.failures == 1 and device.packets == []
+
+
+def test_stop_discards_pending_commands(blocked_writer):
+    writer, device, gate = blocked_writer
+    writer.submit(COMMANDS['red'])
+    writer.stop(timeout=0)
+    gate.set()
+    writer.thread.join(timeout=5)
+
+    assert written(device) == [COMMANDS['off']]
+    writer.submit(COMMANDS['green'])  # Ignored once stopped
+    assert writer.stats()['queued'] == 0
+
+
+def _scheduler_with(count):
+    backend = FakeHIDBackend(count)
+    scheduler = HIDWriteScheduler()
+    for info in backend.enumerate():
+        device = backend.device()
+        device.open_path(info['path'])
+        scheduler.add_device(device, info['path'])
+    return scheduler, backend
+
+
+def test_scheduler_fans_out_to_every_device():
+    scheduler, backend = _scheduler_with(5)
+    try:
+        assert scheduler.submit(COMMANDS['purple']) == 5
+        assert scheduler.flush(timeout=5)
+    finally:
+        scheduler.stop()
+    assert [device.current_color() for device in backend.devices()] == [(0x32, 0x00, 0x32)] * 5
+
+
+def test_scheduler_targets_named_devices():
+    scheduler, backend = _scheduler_with(3)
+    try:
+        assert scheduler.submit(COMMANDS['red'], names={b'fake:1'}) == 1
+        assert scheduler.flush(timeout=5)
+    finally:
+        scheduler.stop()
+    assert [len(device.packets) for device in backend.devices()] == [0, 1, 0]
+
+
+def test_scheduler_rejects_bad_packets_before_any_write():
+    scheduler, backend = _scheduler_with(2)
+    packet = bytearray(color_packet(10, 20, 30))
+    packet[-1] ^= 0xFF
+    try:
+        with pytest.raises(PacketError):
+            scheduler.submit(bytes(packet))
+        assert scheduler.flush(timeout=5)
+    finally:
+        scheduler.stop()
+    assert all(device.packets == [] for device in backend.devices())
+
+
+def test_first_write_is_reported_once():
+    device = FakeHIDDevice()
+    device.open_path(b'fake:0')
+    reported = []
+    writer = DeviceWriter(device, 'light', on_first_write=lambda w: reported.append(w.name))
+    writer.submit(COMMANDS['off'])
+    writer.submit(color_packet(100, 0, 0), key='other')
+    assert writer.flush(5)
+    writer.stop()
+    assert reported == ['light']
@@ -0,0 +1,98 @@
+# ui_render.py
+
+"""
+Rendering helpers for the pygame front end.
+
+TextCache keeps rendered text surfaces so unchanged labels are never
+re-rendered, DirtyRegions redraws only the screen areas whose content
+changed, and FrameStats measures how long each frame takes.
+"""
+
+import time
+from collections import OrderedDict
+
+import pygame
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (text, color)"""
+
+    def __init__(self, font, max_entries=64):
+        self.font = font
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, color=(255, 255, 255)):
+        key = (text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self.font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class DirtyRegions:
+    """Redraws a named screen region only when the state it shows has changed"""
+
+    def __init__(self, screen, background):
+        self.screen = screen
+        self.background = background
+        self.regions = OrderedDict()  # name -> (rect, draw function)
+        self.drawn_state = {}
+
+    def add(self, name, rect, draw):
+        """Register a region; draw(screen, rect, state) paints it"""
+        self.regions[name] = (pygame.Rect(rect), draw)
+
+    def invalidate(self):
+        """Force every region to redraw on the next update"""
+        self.drawn_state.clear()
+
+    def update(self, states):
+        """Redraw regions whose state differs from what is on screen; returns the dirty rects"""
+        dirty = []
+        for name, (rect, draw) in self.regions.items():
+            state = states.get(name)
+            if name in self.drawn_state and self.drawn_state[name] == state:
+                continue
+            self.screen.fill(self.background, rect)
+            draw(self.screen, rect, state)
+            self.drawn_state[name] = state
+            dirty.append(rect)
+        if dirty:
+            pygame.display.update(dirty)
+        return dirty
+
+
+class FrameStats:
+    """Tracks render frame times and how often the loop woke up for nothing"""
+
+    def __init__(self):
+        self.frames = 0
+        self.idle_wakeups = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.started = time.perf_counter()
+
+    def record(self, frame_time, drew):
+        if drew:
+            self.frames += 1
+            self.total_time += frame_time
+            self.max_time = max(self.max_time, frame_time)
+        else:
+            self.idle_wakeups += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        avg = self.total_time / self.frames * 1000 if self.frames else 0.0
+        return (f"{self.frames} frames drawn in {elapsed:.1f}s "
+                f"(avg {avg:.2f} ms, max {self.max_time * 1000:.2f} ms, "
+                f"{self.idle_wakeups} idle wakeups)")